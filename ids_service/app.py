@@ -1,9 +1,14 @@
-from flask import Flask, request, jsonify
-import joblib
-import pandas as pd
+from gevent import monkey
+monkey.patch_all()
+
+from flask import Flask, request
 import numpy as np
 import os
-from inference import predict_handshake, predict_file
+import orjson
+from functools import lru_cache
+import backends
+from batching import BatchingModel
+from inference import predict_handshake, predict_file, HANDSHAKE_COLS, FILE_COLS
 
 app = Flask(__name__)
 
@@ -19,55 +24,122 @@ FILE_FEATURES = ['file_size','file_entropy','file_type_risk','encryption_strengt
 handshake_model = None
 file_model = None
 
+# Max number of distinct feature payloads whose predictions are memoised per endpoint
+PREDICTION_CACHE_SIZE = 4096
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# Concurrent predictions are pooled into one model call of up to this many rows...
+BATCH_MAX_SIZE = int(os.environ.get('IDS_BATCH_MAX_SIZE', 64))
+# ...collected for at most this long (set IDS_BATCH_MAX_SIZE=1 to disable batching)
+BATCH_MAX_WAIT = float(os.environ.get('IDS_BATCH_WAIT_MS', 5)) / 1000
+
+def load_model(name, n_features):
+    """Load the fastest available backend for a trained model and run one warm-up prediction"""
+    model = backends.load_model(MODELS_DIR, name)
+    # Inference builds rows of n_features columns; a model trained on another layout would score garbage
+    if model.n_features_in_ != n_features:
+        raise ValueError(
+            f"{name} model expects {model.n_features_in_} features but inference provides {n_features}; "
+            f"retrain it with enhanced_train.py"
+        )
+    # First predict_proba pays for lazy imports and cold tree pages; take that hit at startup
+    model.predict_proba(np.zeros((1, model.n_features_in_)))
+    if BATCH_MAX_SIZE > 1:
+        model = BatchingModel(model, max_batch=BATCH_MAX_SIZE, max_wait=BATCH_MAX_WAIT)
+    return model
+
 def load_models():
     global handshake_model, file_model
-    handshake_model = joblib.load('models/handshake_model.pkl')
-    file_model = joblib.load('models/file_model.pkl')
+    handshake_model = load_model('handshake', len(HANDSHAKE_COLS))
+    file_model = load_model('file', len(FILE_COLS))
+    # Cached predictions belong to the previous models
+    cached_predict_handshake.cache_clear()
+    cached_predict_file.cache_clear()
     print("Models loaded successfully")
 
+def request_json():
+    """Request body parsed with orjson (much faster than Flask's stdlib-json get_json); None if empty"""
+    body = request.get_data()
+    return orjson.loads(body) if body else None
+
+def json_response(payload, status=200):
+    """JSON response serialized with orjson"""
+    return app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
+
+def prediction_cache_key(data):
+    """Canonical JSON for a request payload, so equal payloads share a cache entry"""
+    return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+
+@lru_cache(maxsize=PREDICTION_CACHE_SIZE)
+def cached_predict_handshake(key):
+    return predict_handshake(orjson.loads(key), handshake_model)
+
+@lru_cache(maxsize=PREDICTION_CACHE_SIZE)
+def cached_predict_file(key):
+    return predict_file(orjson.loads(key), file_model)
+
+def models_unavailable():
+    """503 response used by every route while the models are missing"""
+    return json_response({"status": "unavailable", "models_loaded": False}, 503)
+
 # Health check
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy", "models_loaded": handshake_model is not None})
+    # 503 while the models are missing, so load balancers and orchestrators keep traffic away
+    if handshake_model is None or file_model is None:
+        return models_unavailable()
+    return json_response({"status": "healthy", "models_loaded": True})
 
 # Predict handshake
 @app.route('/predict/handshake', methods=['POST'])
 def predict_handshake_endpoint():
+    if handshake_model is None:
+        return models_unavailable()
     try:
-        data = request.get_json()
+        data = request_json()
         if not data:
-            return jsonify({"error": "No data provided"}), 400
+            return json_response({"error": "No data provided"}, 400)
         
-        # Use enhanced inference function
-        anomaly_score, verdict = predict_handshake(data, handshake_model)
+        # Use enhanced inference function (memoised for repeated payloads)
+        anomaly_score, verdict = cached_predict_handshake(prediction_cache_key(data))
         
-        return jsonify({
+        return json_response({
             "anomaly_score": float(anomaly_score),
             "verdict": verdict,
             "confidence": float(anomaly_score)
         })
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 # Predict file
 @app.route('/predict/file', methods=['POST'])
 def predict_file_endpoint():
+    if file_model is None:
+        return models_unavailable()
     try:
-        data = request.get_json()
+        data = request_json()
         if not data:
-            return jsonify({"error": "No data provided"}), 400
+            return json_response({"error": "No data provided"}, 400)
         
-        # Use enhanced inference function
-        anomaly_score, verdict = predict_file(data, file_model)
+        # Use enhanced inference function (memoised for repeated payloads)
+        anomaly_score, verdict = cached_predict_file(prediction_cache_key(data))
         
-        return jsonify({
+        return json_response({
             "anomaly_score": float(anomaly_score),
             "verdict": verdict,
             "confidence": float(anomaly_score)
         })
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
-if __name__ == '__main__':
+# Load at import time so gunicorn --preload loads the models once and workers share them.
+# Missing or mismatched models leave the service up, reporting 503 on /health, so it can be inspected.
+try:
     load_models()
-    app.run(host='0.0.0.0', port=6000, debug=True)
+except (FileNotFoundError, ValueError) as e:
+    print(f"Models not loaded: {e}")
+
+if __name__ == '__main__':
+    # Local development only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=6000)
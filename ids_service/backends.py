@@ -0,0 +1,145 @@
+"""
+Model backends for IDS inference
+Every backend exposes predict_proba(X) like a scikit-learn classifier, so
+predict_handshake / predict_file work unchanged whichever one is loaded
+"""
+
+import os
+import json
+import joblib
+import numpy as np
+import forest_layout
+
+# Treelite compiles a trained forest into a native shared library (optional)
+try:
+    import treelite
+    import tl2cgen
+except ImportError:
+    treelite = tl2cgen = None
+
+# ONNX Runtime evaluates models exported with skl2onnx (optional)
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+class TreelitePredictor:
+    """Forest compiled to straight-line native code with Treelite / TL2cgen"""
+
+    def __init__(self, libpath):
+        # One thread per predict: concurrency comes from the gunicorn workers, and the default
+        # (all cores in every worker) oversubscribes the CPUs
+        self.predictor = tl2cgen.Predictor(libpath, nthread=1)
+        self.n_features_in_ = self.predictor.num_feature
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        scores = self.predictor.predict(tl2cgen.DMatrix(X)).reshape(len(X), -1)
+        if scores.shape[1] == 1:
+            # Binary boosted models only emit P(class 1)
+            scores = np.hstack([1 - scores, scores])
+        return scores
+
+
+def export_treelite(model, libpath):
+    """Compile a trained scikit-learn model to a Treelite shared library; returns False if unavailable"""
+    if treelite is None:
+        return False
+    tl_model = treelite.sklearn.import_model(model)
+    tl2cgen.export_lib(tl_model, toolchain='gcc', libpath=libpath, params={'parallel_comp': 4})
+    return True
+
+
+class OnnxPredictor:
+    """Model exported to ONNX and evaluated by an ONNX Runtime CPU session"""
+
+    def __init__(self, path):
+        # Single-threaded for the same reason as TreelitePredictor (0, the default, means all cores)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.n_features_in_ = self.session.get_inputs()[0].shape[1]
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        return self.session.run(['probabilities'], {self.input_name: X})[0]
+
+
+def export_onnx(model, path):
+    """Convert a trained scikit-learn model to an ONNX file; returns False if skl2onnx is unavailable or fails"""
+    try:
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType
+    except ImportError:
+        return False
+    try:
+        onx = convert_sklearn(
+            model,
+            initial_types=[('X', FloatTensorType([None, model.n_features_in_]))],
+            options={id(model): {'zipmap': False}}  # plain probability tensor instead of a list of dicts
+        )
+    except Exception as e:
+        # Converter support lags scikit-learn releases; the pickle and Treelite backends still work
+        print(f"   ONNX export skipped: {type(e).__name__}")
+        return False
+    with open(path, 'wb') as f:
+        f.write(onx.SerializeToString())
+    return True
+
+
+def _is_current(artifact, pkl_path):
+    """True if a derived model artifact exists and is not older than the pickle it was built from"""
+    return os.path.exists(artifact) and (
+        not os.path.exists(pkl_path) or os.path.getmtime(artifact) >= os.path.getmtime(pkl_path)
+    )
+
+
+def _load_quantization(models_dir, name):
+    """Per-feature quantization offset/scale recorded by the training script, or None"""
+    metadata_path = os.path.join(models_dir, f'{name}_model.json')
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path) as f:
+        return json.load(f).get('quantization')
+
+
+def load_model(models_dir, name, backend=None):
+    """
+    Load the fastest available backend for a trained model
+
+    Args:
+        models_dir: directory holding the trained model files
+        name: model name, e.g. 'handshake' for handshake_model.pkl
+        backend: 'auto' (default, or the IDS_BACKEND env var) tries treelite,
+            onnx, packed and sklearn in that order; naming one forces it.
+            'quantized' is never picked automatically since it is lossy.
+
+    Returns:
+        object with predict_proba(X) and n_features_in_
+    """
+    backend = backend or os.environ.get('IDS_BACKEND', 'auto')
+    pkl_path = os.path.join(models_dir, f'{name}_model.pkl')
+
+    libpath = os.path.join(models_dir, f'{name}_model.so')
+    if backend in ('auto', 'treelite') and tl2cgen is not None and _is_current(libpath, pkl_path):
+        return TreelitePredictor(libpath)
+
+    onnx_path = os.path.join(models_dir, f'{name}_model.onnx')
+    if backend in ('auto', 'onnx') and onnxruntime is not None and _is_current(onnx_path, pkl_path):
+        return OnnxPredictor(onnx_path)
+
+    model = joblib.load(pkl_path)
+    if getattr(model, 'n_jobs', None) is not None:
+        # Trained with n_jobs=-1; on one-row predicts joblib dispatch costs more than the trees,
+        # and concurrency already comes from the gunicorn workers
+        model.n_jobs = 1
+    if forest_layout.supports(model):
+        quantization = _load_quantization(models_dir, name) if backend == 'quantized' else None
+        if quantization:
+            return forest_layout.QuantizedForest(model, quantization['offset'], quantization['scale'])
+        if backend in ('auto', 'packed', 'quantized'):
+            return forest_layout.PackedForest(model)
+    return model
@@ -0,0 +1,101 @@
+"""
+Micro-batching for IDS model calls
+Concurrent requests are collected for a few milliseconds and scored with a
+single predict_proba call on the stacked rows
+"""
+
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+
+class _PendingPrediction:
+    """One caller's rows, waiting for their slice of a batched result"""
+
+    def __init__(self, X):
+        self.X = X
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchingModel:
+    """
+    Wraps a model so concurrent predict_proba calls share one batched model call
+
+    Args:
+        model: object with predict_proba(X) and n_features_in_
+        max_batch: most rows scored in a single model call
+        max_wait: seconds to keep collecting once a batch has more than one request
+    """
+
+    def __init__(self, model, max_batch=64, max_wait=0.005):
+        self.model = model
+        self.n_features_in_ = model.n_features_in_
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._requests = None
+        self._worker_pid = None
+
+    def predict_proba(self, X):
+        self._ensure_worker()
+        # Copy: callers hand in reusable row buffers
+        pending = _PendingPrediction(np.array(X, dtype=np.float32, ndmin=2))
+        self._requests.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_worker(self):
+        """Start the batching thread, again after a fork (threads do not survive gunicorn --preload forks)"""
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid != os.getpid():
+                self._requests = queue.Queue()
+                threading.Thread(target=self._run, args=(self._requests,), daemon=True).start()
+                self._worker_pid = os.getpid()
+
+    def _collect(self, requests):
+        """
+        Block for the first request; if others are already queued, gather more until the batch is full or max_wait passes
+
+        A lone request (nothing else queued) is dispatched at once, so low
+        load never pays the max_wait latency.
+        """
+        batch = [requests.get()]
+        rows = len(batch[0].X)
+        if requests.empty():
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Past the deadline, still take whatever is already queued
+                pending = requests.get(timeout=remaining) if remaining > 0 else requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(pending)
+            rows += len(pending.X)
+        return batch
+
+    def _run(self, requests):
+        while True:
+            batch = self._collect(requests)
+            try:
+                probabilities = self.model.predict_proba(np.vstack([p.X for p in batch]))
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+
+            start = 0
+            for pending in batch:
+                pending.result = probabilities[start:start + len(pending.X)]
+                start += len(pending.X)
+                pending.done.set()
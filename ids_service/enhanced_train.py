@@ -5,44 +5,87 @@ Trains robust models for handshake and file anomaly detection
 
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.model_selection import train_test_split, cross_val_score, StratifiedKFold
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import (
-    roc_auc_score, classification_report, confusion_matrix,
-    precision_recall_curve, roc_curve, accuracy_score
-)
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.inspection import permutation_importance
+from sklearn.model_selection import cross_validate, StratifiedKFold
+from sklearn.metrics import classification_report
 import joblib
+import json
 import os
-from pathlib import Path
+from backends import export_treelite, export_onnx
+from forest_layout import quantization_params
+
+# lz4 decompresses several times faster than zlib, which keeps model load (cold start) short
+try:
+    import lz4.frame  # noqa: F401
+    MODEL_COMPRESSION = ('lz4', 3)
+except ImportError:
+    MODEL_COMPRESSION = 3
+
+# Candidate (n_estimators, max_depth) sizes; prediction cost grows with trees x depth
+MODEL_SIZE_GRID = [(n, d) for n in (50, 100, 150) for d in (6, 8, 10, 12)]
+# Keep the cheapest size whose CV ROC-AUC is within this fraction of the best one
+MODEL_SIZE_TOLERANCE = 0.005
+# Folds shared by model-size selection and evaluation; the deployed model is one of the fold models
+CV_SPLITTER = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
+
+# bincount allocates one slot per value up to the maximum, so only small non-negative integers use it
+BINCOUNT_MAX_VALUE = 65535
 
 # Feature engineering functions
 def calculate_entropy(data):
     """Calculate Shannon entropy"""
-    if len(data) == 0:
+    data = np.asarray(data).ravel()
+    if data.size == 0:
         return 0.0
-    value_counts = pd.Series(data).value_counts()
-    probabilities = value_counts / len(data)
-    entropy = -np.sum(probabilities * np.log2(probabilities + 1e-10))
-    return entropy
+    if data.dtype.kind in 'iub' and data.min() >= 0 and data.max() <= BINCOUNT_MAX_VALUE:
+        counts = np.bincount(data)  # byte-like data: direct counting, no hashing
+    else:
+        _, counts = np.unique(data, return_counts=True)
+    probabilities = counts[counts > 0] / data.size
+    return float(-np.sum(probabilities * np.log2(probabilities)))
 
-def extract_handshake_features(row):
-    """Extract comprehensive handshake features"""
-    features = {
-        'handshake_duration': row.get('handshake_duration', 0),
-        'key_size': row.get('key_size', 256),
-        'signature_valid': int(row.get('signature_valid', True)),
-        'client_entropy': row.get('client_entropy', 0),
-        'server_entropy': row.get('server_entropy', 0),
-        'retry_count': row.get('retry_count', 0),
-        'timestamp_hour': row.get('timestamp_hour', 12),
-        'ip_reputation': row.get('ip_reputation', 0.5),
-        'geolocation_risk': row.get('geolocation_risk', 0.2),
-        'protocol_version': row.get('protocol_version', 1.0),
-    }
+# Base feature columns in model order, with the default used when a column is absent
+HANDSHAKE_BASE_FEATURES = {
+    'handshake_duration': 0,
+    'key_size': 256,
+    'signature_valid': True,
+    'client_entropy': 0,
+    'server_entropy': 0,
+    'retry_count': 0,
+    'timestamp_hour': 12,
+    'ip_reputation': 0.5,
+    'geolocation_risk': 0.2,
+    'protocol_version': 1.0,
+}
+
+FILE_BASE_FEATURES = {
+    'file_size': 0,
+    'file_entropy': 0,
+    'file_type_risk': 0.2,
+    'encryption_strength': 256,
+    'upload_duration': 1.0,
+    'compression_ratio': 1.0,
+    'metadata_anomaly': 0,
+    'transfer_speed': 1000,
+    'packet_loss': 0.0,
+    'concurrent_uploads': 1,
+}
+
+def _select_base_features(df, defaults):
+    """Copy the base feature columns out of df, filling missing ones with defaults"""
+    return pd.DataFrame(
+        {col: df[col] if col in df else default for col, default in defaults.items()},
+        index=df.index
+    )
+
+def extract_handshake_features_df(df):
+    """Extract comprehensive handshake features for a whole DataFrame at once"""
+    features = _select_base_features(df, HANDSHAKE_BASE_FEATURES)
+    features['signature_valid'] = features['signature_valid'].astype(int)
     
     # Derived features
-    features['entropy_diff'] = abs(features['client_entropy'] - features['server_entropy'])
+    features['entropy_diff'] = (features['client_entropy'] - features['server_entropy']).abs()
     features['entropy_ratio'] = features['client_entropy'] / (features['server_entropy'] + 1e-10)
     features['duration_per_byte'] = features['handshake_duration'] / (features['key_size'] + 1)
     features['risk_composite'] = (features['ip_reputation'] + features['geolocation_risk']) / 2
@@ -50,30 +93,19 @@ def extract_handshake_features(row):
     
     return features
 
-def extract_file_features(row):
-    """Extract comprehensive file features"""
-    features = {
-        'file_size': row.get('file_size', 0),
-        'file_entropy': row.get('file_entropy', 0),
-        'file_type_risk': row.get('file_type_risk', 0.2),
-        'encryption_strength': row.get('encryption_strength', 256),
-        'upload_duration': row.get('upload_duration', 1.0),
-        'compression_ratio': row.get('compression_ratio', 1.0),
-        'metadata_anomaly': row.get('metadata_anomaly', 0),
-        'transfer_speed': row.get('transfer_speed', 1000),
-        'packet_loss': row.get('packet_loss', 0.0),
-        'concurrent_uploads': row.get('concurrent_uploads', 1),
-    }
+def extract_file_features_df(df):
+    """Extract comprehensive file features for a whole DataFrame at once"""
+    features = _select_base_features(df, FILE_BASE_FEATURES)
     
     # Derived features
-    features['size_log'] = np.log1p(features['file_size'])
+    features['size_log'] = np.log1p(features['file_size'].values)
     features['entropy_per_byte'] = features['file_entropy'] / (features['file_size'] + 1)
     features['speed_per_mb'] = features['transfer_speed'] / ((features['file_size'] / 1024 / 1024) + 1)
     features['risk_score'] = (
         features['file_type_risk'] * 0.3 +
         (features['file_entropy'] / 8.0) * 0.3 +
         (features['metadata_anomaly'] / 10.0) * 0.2 +
-        min(features['packet_loss'], 1.0) * 0.2
+        features['packet_loss'].clip(upper=1.0) * 0.2
     )
     features['suspicious_ratio'] = (
         features['file_entropy'] / 8.0 +
@@ -81,107 +113,175 @@ def extract_file_features(row):
     ) / 2
     
     # High entropy flag
-    features['high_entropy'] = int(features['file_entropy'] > 7.5)
-    features['low_entropy'] = int(features['file_entropy'] < 3.0)
-    features['suspicious_size'] = int(features['file_size'] > 50 * 1024 * 1024)  # >50MB
+    features['high_entropy'] = (features['file_entropy'] > 7.5).astype(np.int8)
+    features['low_entropy'] = (features['file_entropy'] < 3.0).astype(np.int8)
+    features['suspicious_size'] = (features['file_size'] > 50 * 1024 * 1024).astype(np.int8)  # >50MB
     
     return features
 
 def generate_synthetic_handshake_data(n_samples=2000, malicious_ratio=0.3):
     """Generate synthetic handshake data for training"""
     np.random.seed(42)
-    data = []
     
     # Normal handshakes
     n_normal = int(n_samples * (1 - malicious_ratio))
-    for _ in range(n_normal):
-        data.append({
-            'handshake_duration': np.random.normal(150, 30),
-            'key_size': 256,
-            'signature_valid': True,
-            'client_entropy': np.random.normal(7.2, 0.3),
-            'server_entropy': np.random.normal(7.2, 0.3),
-            'retry_count': np.random.poisson(0.5),
-            'timestamp_hour': np.random.randint(0, 24),
-            'ip_reputation': np.random.uniform(0.7, 1.0),
-            'geolocation_risk': np.random.uniform(0.0, 0.3),
-            'protocol_version': 1.0,
-            'label': 0  # Normal
-        })
+    normal = {
+        'handshake_duration': np.random.normal(150, 30, n_normal),
+        'key_size': np.full(n_normal, 256),
+        'signature_valid': np.ones(n_normal, dtype=bool),
+        'client_entropy': np.random.normal(7.2, 0.3, n_normal),
+        'server_entropy': np.random.normal(7.2, 0.3, n_normal),
+        'retry_count': np.random.poisson(0.5, n_normal),
+        'timestamp_hour': np.random.randint(0, 24, n_normal),
+        'ip_reputation': np.random.uniform(0.7, 1.0, n_normal),
+        'geolocation_risk': np.random.uniform(0.0, 0.3, n_normal),
+        'protocol_version': np.full(n_normal, 1.0),
+        'label': np.zeros(n_normal, dtype=int)  # Normal
+    }
     
     # Malicious handshakes
     n_malicious = n_samples - n_normal
-    for _ in range(n_malicious):
-        data.append({
-            'handshake_duration': np.random.normal(300, 100),  # Longer
-            'key_size': np.random.choice([128, 256, 512]),
-            'signature_valid': np.random.choice([True, False], p=[0.3, 0.7]),  # Often invalid
-            'client_entropy': np.random.normal(6.0, 1.0),  # Lower or higher
-            'server_entropy': np.random.normal(7.5, 0.5),
-            'retry_count': np.random.poisson(3),  # More retries
-            'timestamp_hour': np.random.randint(0, 24),
-            'ip_reputation': np.random.uniform(0.0, 0.5),  # Lower reputation
-            'geolocation_risk': np.random.uniform(0.5, 1.0),  # Higher risk
-            'protocol_version': np.random.choice([0.9, 1.0, 1.1]),
-            'label': 1  # Malicious
-        })
-    
-    return pd.DataFrame(data)
+    malicious = {
+        'handshake_duration': np.random.normal(300, 100, n_malicious),  # Longer
+        'key_size': np.random.choice([128, 256, 512], n_malicious),
+        'signature_valid': np.random.choice([True, False], n_malicious, p=[0.3, 0.7]),  # Often invalid
+        'client_entropy': np.random.normal(6.0, 1.0, n_malicious),  # Lower or higher
+        'server_entropy': np.random.normal(7.5, 0.5, n_malicious),
+        'retry_count': np.random.poisson(3, n_malicious),  # More retries
+        'timestamp_hour': np.random.randint(0, 24, n_malicious),
+        'ip_reputation': np.random.uniform(0.0, 0.5, n_malicious),  # Lower reputation
+        'geolocation_risk': np.random.uniform(0.5, 1.0, n_malicious),  # Higher risk
+        'protocol_version': np.random.choice([0.9, 1.0, 1.1], n_malicious),
+        'label': np.ones(n_malicious, dtype=int)  # Malicious
+    }
+    
+    return pd.DataFrame({col: np.concatenate([normal[col], malicious[col]]) for col in normal})
 
 def generate_synthetic_file_data(n_samples=2000, malicious_ratio=0.3):
     """Generate synthetic file data for training"""
     np.random.seed(42)
-    data = []
     
     # Normal files
     n_normal = int(n_samples * (1 - malicious_ratio))
-    for _ in range(n_normal):
-        size = np.random.lognormal(12, 1.5)  # Realistic file sizes
-        data.append({
-            'file_size': size,
-            'file_entropy': np.random.normal(5.5, 1.0),  # Normal entropy
-            'file_type_risk': np.random.uniform(0.0, 0.3),
-            'encryption_strength': 256,
-            'upload_duration': size / np.random.uniform(50000, 200000),
-            'compression_ratio': np.random.uniform(0.8, 1.2),
-            'metadata_anomaly': np.random.uniform(0.0, 2.0),
-            'transfer_speed': np.random.uniform(50000, 200000),
-            'packet_loss': np.random.uniform(0.0, 0.05),
-            'concurrent_uploads': np.random.randint(1, 3),
-            'label': 0  # Normal
-        })
+    normal_size = np.random.lognormal(12, 1.5, n_normal)  # Realistic file sizes
+    normal = {
+        'file_size': normal_size,
+        'file_entropy': np.random.normal(5.5, 1.0, n_normal),  # Normal entropy
+        'file_type_risk': np.random.uniform(0.0, 0.3, n_normal),
+        'encryption_strength': np.full(n_normal, 256),
+        'upload_duration': normal_size / np.random.uniform(50000, 200000, n_normal),
+        'compression_ratio': np.random.uniform(0.8, 1.2, n_normal),
+        'metadata_anomaly': np.random.uniform(0.0, 2.0, n_normal),
+        'transfer_speed': np.random.uniform(50000, 200000, n_normal),
+        'packet_loss': np.random.uniform(0.0, 0.05, n_normal),
+        'concurrent_uploads': np.random.randint(1, 3, n_normal),
+        'label': np.zeros(n_normal, dtype=int)  # Normal
+    }
     
     # Malicious files (corrupted, encrypted, suspicious)
     n_malicious = n_samples - n_normal
-    for _ in range(n_malicious):
-        size = np.random.lognormal(13, 2)
-        malicious_type = np.random.choice(['high_entropy', 'corrupted', 'suspicious'])
-        
-        if malicious_type == 'high_entropy':
-            entropy = np.random.uniform(7.5, 8.0)  # Very high entropy
-            type_risk = np.random.uniform(0.6, 1.0)
-        elif malicious_type == 'corrupted':
-            entropy = np.random.uniform(1.0, 3.0)  # Very low entropy
-            type_risk = np.random.uniform(0.7, 1.0)
-        else:  # suspicious
-            entropy = np.random.uniform(6.5, 7.5)
-            type_risk = np.random.uniform(0.5, 0.9)
-        
-        data.append({
-            'file_size': size,
-            'file_entropy': entropy,
-            'file_type_risk': type_risk,
-            'encryption_strength': np.random.choice([128, 256, 512]),
-            'upload_duration': size / np.random.uniform(10000, 50000),  # Slower
-            'compression_ratio': np.random.uniform(0.3, 0.8),  # Odd compression
-            'metadata_anomaly': np.random.uniform(5.0, 10.0),  # High anomaly
-            'transfer_speed': np.random.uniform(10000, 50000),  # Slower
-            'packet_loss': np.random.uniform(0.1, 0.5),  # Higher packet loss
-            'concurrent_uploads': np.random.randint(3, 10),  # More concurrent
-            'label': 1  # Malicious
-        })
-    
-    return pd.DataFrame(data)
+    malicious_size = np.random.lognormal(13, 2, n_malicious)
+    malicious_type = np.random.choice(['high_entropy', 'corrupted', 'suspicious'], n_malicious)
+    is_high_entropy = malicious_type == 'high_entropy'
+    is_corrupted = malicious_type == 'corrupted'
+    
+    entropy = np.select(
+        [is_high_entropy, is_corrupted],
+        [np.random.uniform(7.5, 8.0, n_malicious),   # Very high entropy
+         np.random.uniform(1.0, 3.0, n_malicious)],  # Very low entropy
+        default=np.random.uniform(6.5, 7.5, n_malicious)  # suspicious
+    )
+    type_risk = np.select(
+        [is_high_entropy, is_corrupted],
+        [np.random.uniform(0.6, 1.0, n_malicious),
+         np.random.uniform(0.7, 1.0, n_malicious)],
+        default=np.random.uniform(0.5, 0.9, n_malicious)
+    )
+    
+    malicious = {
+        'file_size': malicious_size,
+        'file_entropy': entropy,
+        'file_type_risk': type_risk,
+        'encryption_strength': np.random.choice([128, 256, 512], n_malicious),
+        'upload_duration': malicious_size / np.random.uniform(10000, 50000, n_malicious),  # Slower
+        'compression_ratio': np.random.uniform(0.3, 0.8, n_malicious),  # Odd compression
+        'metadata_anomaly': np.random.uniform(5.0, 10.0, n_malicious),  # High anomaly
+        'transfer_speed': np.random.uniform(10000, 50000, n_malicious),  # Slower
+        'packet_loss': np.random.uniform(0.1, 0.5, n_malicious),  # Higher packet loss
+        'concurrent_uploads': np.random.randint(3, 10, n_malicious),  # More concurrent
+        'label': np.ones(n_malicious, dtype=int)  # Malicious
+    }
+    
+    return pd.DataFrame({col: np.concatenate([normal[col], malicious[col]]) for col in normal})
+
+def make_handshake_model(n_estimators, max_depth):
+    """Random Forest used for handshake anomaly detection"""
+    return RandomForestClassifier(
+        n_estimators=n_estimators,
+        max_depth=max_depth,
+        min_samples_split=5,
+        min_samples_leaf=2,
+        class_weight='balanced',
+        random_state=42,
+        n_jobs=-1
+    )
+
+def make_file_model(n_estimators, max_depth):
+    """Histogram Gradient Boosting model used for file anomaly detection; n_estimators caps the boosting iterations"""
+    return HistGradientBoostingClassifier(
+        max_iter=n_estimators,
+        max_depth=max_depth,
+        learning_rate=0.1,
+        early_stopping=True,
+        random_state=42
+    )
+
+def select_model_size(make_model, X, y):
+    """
+    Cross-validate every size in MODEL_SIZE_GRID on CV_SPLITTER and pick the cheapest near-best one
+    
+    Returns:
+        tuple: (n_estimators, max_depth, cv_results) where cv_results is the
+        cross_validate output for that size: per-fold scores, fitted
+        estimators and train/test indices
+    """
+    results = []
+    for n_estimators, max_depth in MODEL_SIZE_GRID:
+        cv_results = cross_validate(
+            make_model(n_estimators, max_depth), X, y, cv=CV_SPLITTER,
+            scoring=['roc_auc', 'accuracy'], return_estimator=True, return_indices=True, n_jobs=-1
+        )
+        auc = cv_results['test_roc_auc'].mean()
+        results.append((n_estimators, max_depth, auc, cv_results))
+        print(f"   n_estimators={n_estimators:<4} max_depth={max_depth:<3} CV ROC-AUC: {auc:.4f}")
+    
+    best_auc = max(r[2] for r in results)
+    good_enough = [r for r in results if r[2] >= best_auc * (1 - MODEL_SIZE_TOLERANCE)]
+    n_estimators, max_depth, _, cv_results = min(good_enough, key=lambda r: (r[0] * r[1], r[0]))
+    return n_estimators, max_depth, cv_results
+
+def save_model_metadata(path, model, X_train, **metrics):
+    """Write model size, feature order, int16 quantization ranges and evaluation metrics next to a saved model"""
+    offset, scale = quantization_params(X_train)
+    metadata = {
+        'model_type': type(model).__name__,
+        # Histogram boosting has no n_estimators; record the iterations kept after early stopping
+        'n_estimators': getattr(model, 'n_estimators', None) or int(model.n_iter_),
+        'max_depth': model.max_depth,
+        'features': list(X_train.columns),
+        'quantization': {'offset': offset.tolist(), 'scale': scale.tolist()},
+        **{name: float(value) for name, value in metrics.items()},
+    }
+    with open(path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+def feature_importances(model, X_test, y_test):
+    """Impurity importances where the model has them, otherwise ROC-AUC permutation importances on the test set"""
+    if hasattr(model, 'feature_importances_'):
+        return model.feature_importances_
+    result = permutation_importance(model, X_test, y_test, scoring='roc_auc', n_repeats=5,
+                                    random_state=42, n_jobs=-1)
+    return result.importances_mean
 
 def train_handshake_model():
     """Train handshake anomaly detection model"""
@@ -196,67 +296,56 @@ def train_handshake_model():
     
     # Extract features
     print("\n2. Extracting features...")
-    features_list = []
-    for _, row in df.iterrows():
-        feat = extract_handshake_features(row)
-        feat['label'] = row['label']
-        features_list.append(feat)
-    
-    feature_df = pd.DataFrame(features_list)
-    print(f"   Extracted {len(feature_df.columns) - 1} features")
-    
-    # Prepare data
-    X = feature_df.drop(columns=['label'])
-    y = feature_df['label']
-    
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, stratify=y, random_state=42
-    )
-    print(f"\n3. Data split: Train={len(X_train)}, Test={len(X_test)}")
+    X = extract_handshake_features_df(df)
+    y = df['label']
+    print(f"   Extracted {len(X.columns)} features")
+    
+    # Train and cross-validate every model size on the same 5 folds
+    print("\n3. Selecting model size (5-fold cross-validation)...")
+    n_estimators, max_depth, cv_results = select_model_size(make_handshake_model, X, y)
+    print(f"   Selected n_estimators={n_estimators}, max_depth={max_depth}")
+    cv_scores = cv_results['test_roc_auc']
+    print(f"   CV ROC-AUC: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
     
-    # Train model
-    print("\n4. Training Random Forest model...")
-    model = RandomForestClassifier(
-        n_estimators=300,
-        max_depth=15,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        class_weight='balanced',
-        random_state=42,
-        n_jobs=-1
-    )
-    model.fit(X_train, y_train)
+    # Keep the fold model with the best validation ROC-AUC instead of refitting
+    best = int(np.argmax(cv_scores))
+    model = cv_results['estimator'][best]
+    train_idx, test_idx = cv_results['indices']['train'][best], cv_results['indices']['test'][best]
+    X_train, X_test, y_test = X.iloc[train_idx], X.iloc[test_idx], y.iloc[test_idx]
+    print(f"\n4. Using Random Forest model from fold {best + 1}: Train={len(X_train)}, Validation={len(X_test)}")
     
     # Evaluate
-    print("\n5. Evaluating model...")
+    print("\n5. Evaluating model on its validation fold...")
     y_pred = model.predict(X_test)
-    y_pred_proba = model.predict_proba(X_test)[:, 1]
-    
-    accuracy = accuracy_score(y_test, y_pred)
-    auc = roc_auc_score(y_test, y_pred_proba)
+    accuracy = cv_results['test_accuracy'][best]
+    auc = cv_scores[best]
     
     print(f"\n   Accuracy: {accuracy:.4f}")
     print(f"   ROC-AUC: {auc:.4f}")
     print("\n   Classification Report:")
     print(classification_report(y_test, y_pred, target_names=['Normal', 'Malicious']))
     
-    # Cross-validation
-    print("\n6. Cross-validation...")
-    cv_scores = cross_val_score(model, X, y, cv=5, scoring='roc_auc')
-    print(f"   CV ROC-AUC: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
-    
     # Save model
     os.makedirs('models', exist_ok=True)
     model_path = 'models/handshake_model.pkl'
-    joblib.dump(model, model_path)
-    print(f"\n7. Model saved to {model_path}")
+    joblib.dump(model, model_path, compress=MODEL_COMPRESSION, protocol=5)
+    print(f"\n6. Model saved to {model_path}")
+    lib_path = 'models/handshake_model.so'
+    if export_treelite(model, lib_path):
+        print(f"   Compiled Treelite library saved to {lib_path}")
+    onnx_path = 'models/handshake_model.onnx'
+    if export_onnx(model, onnx_path):
+        print(f"   ONNX model saved to {onnx_path}")
+    metadata_path = 'models/handshake_model.json'
+    save_model_metadata(metadata_path, model, X_train,
+                        accuracy=accuracy, roc_auc=auc, cv_roc_auc=cv_scores.mean())
+    print(f"   Model metadata saved to {metadata_path}")
     
     # Feature importance
-    print("\n8. Top 10 Feature Importances:")
+    print("\n7. Top 10 Feature Importances:")
     feature_importance = pd.DataFrame({
         'feature': X.columns,
-        'importance': model.feature_importances_
+        'importance': feature_importances(model, X_test, y_test)
     }).sort_values('importance', ascending=False)
     print(feature_importance.head(10).to_string(index=False))
     
@@ -275,66 +364,56 @@ def train_file_model():
     
     # Extract features
     print("\n2. Extracting features...")
-    features_list = []
-    for _, row in df.iterrows():
-        feat = extract_file_features(row)
-        feat['label'] = row['label']
-        features_list.append(feat)
-    
-    feature_df = pd.DataFrame(features_list)
-    print(f"   Extracted {len(feature_df.columns) - 1} features")
-    
-    # Prepare data
-    X = feature_df.drop(columns=['label'])
-    y = feature_df['label']
-    
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, stratify=y, random_state=42
-    )
-    print(f"\n3. Data split: Train={len(X_train)}, Test={len(X_test)}")
+    X = extract_file_features_df(df)
+    y = df['label']
+    print(f"   Extracted {len(X.columns)} features")
+    
+    # Train and cross-validate every model size on the same 5 folds
+    print("\n3. Selecting model size (5-fold cross-validation)...")
+    n_estimators, max_depth, cv_results = select_model_size(make_file_model, X, y)
+    print(f"   Selected n_estimators={n_estimators}, max_depth={max_depth}")
+    cv_scores = cv_results['test_roc_auc']
+    print(f"   CV ROC-AUC: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
     
-    # Train model
-    print("\n4. Training Gradient Boosting model...")
-    model = GradientBoostingClassifier(
-        n_estimators=200,
-        max_depth=10,
-        learning_rate=0.1,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        random_state=42
-    )
-    model.fit(X_train, y_train)
+    # Keep the fold model with the best validation ROC-AUC instead of refitting
+    best = int(np.argmax(cv_scores))
+    model = cv_results['estimator'][best]
+    train_idx, test_idx = cv_results['indices']['train'][best], cv_results['indices']['test'][best]
+    X_train, X_test, y_test = X.iloc[train_idx], X.iloc[test_idx], y.iloc[test_idx]
+    print(f"\n4. Using Histogram Gradient Boosting model from fold {best + 1}: Train={len(X_train)}, Validation={len(X_test)}")
     
     # Evaluate
-    print("\n5. Evaluating model...")
+    print("\n5. Evaluating model on its validation fold...")
     y_pred = model.predict(X_test)
-    y_pred_proba = model.predict_proba(X_test)[:, 1]
-    
-    accuracy = accuracy_score(y_test, y_pred)
-    auc = roc_auc_score(y_test, y_pred_proba)
+    accuracy = cv_results['test_accuracy'][best]
+    auc = cv_scores[best]
     
     print(f"\n   Accuracy: {accuracy:.4f}")
     print(f"   ROC-AUC: {auc:.4f}")
     print("\n   Classification Report:")
     print(classification_report(y_test, y_pred, target_names=['Normal', 'Malicious']))
     
-    # Cross-validation
-    print("\n6. Cross-validation...")
-    cv_scores = cross_val_score(model, X, y, cv=5, scoring='roc_auc')
-    print(f"   CV ROC-AUC: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
-    
     # Save model
     os.makedirs('models', exist_ok=True)
     model_path = 'models/file_model.pkl'
-    joblib.dump(model, model_path)
-    print(f"\n7. Model saved to {model_path}")
+    joblib.dump(model, model_path, compress=MODEL_COMPRESSION, protocol=5)
+    print(f"\n6. Model saved to {model_path}")
+    lib_path = 'models/file_model.so'
+    if export_treelite(model, lib_path):
+        print(f"   Compiled Treelite library saved to {lib_path}")
+    onnx_path = 'models/file_model.onnx'
+    if export_onnx(model, onnx_path):
+        print(f"   ONNX model saved to {onnx_path}")
+    metadata_path = 'models/file_model.json'
+    save_model_metadata(metadata_path, model, X_train,
+                        accuracy=accuracy, roc_auc=auc, cv_roc_auc=cv_scores.mean())
+    print(f"   Model metadata saved to {metadata_path}")
     
     # Feature importance
-    print("\n8. Top 10 Feature Importances:")
+    print("\n7. Top 10 Feature Importances:")
     feature_importance = pd.DataFrame({
         'feature': X.columns,
-        'importance': model.feature_importances_
+        'importance': feature_importances(model, X_test, y_test)
     }).sort_values('importance', ascending=False)
     print(feature_importance.head(10).to_string(index=False))
     
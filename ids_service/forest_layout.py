@@ -0,0 +1,158 @@
+"""
+Cache-friendly random forest layout for IDS inference
+Rewrites a trained scikit-learn forest into flat struct-of-arrays node
+tables and walks every tree in lockstep with NumPy
+"""
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+
+# Nodes per 64-byte cache line for the float32 threshold table; each tree starts on a block boundary
+NODES_PER_BLOCK = 16
+
+
+def supports(model):
+    """True if model is a fitted forest of decision trees that PackedForest can lay out"""
+    return isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)) and hasattr(model, 'estimators_')
+
+
+def hot_path_order(tree):
+    """Weighted depth-first node order: after each split, the child more training samples took comes next"""
+    left, right = tree.children_left, tree.children_right
+    weight = tree.weighted_n_node_samples
+    order = []
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        if left[node] != -1:
+            hot, cold = left[node], right[node]
+            if weight[cold] > weight[hot]:
+                hot, cold = cold, hot
+            stack.append(cold)
+            stack.append(hot)
+    return np.array(order)
+
+
+def float32_at_most(values):
+    """Largest float32 <= each value, so 'x <= t' on float32 inputs matches scikit-learn's float64 split"""
+    rounded = values.astype(np.float32)
+    return np.where(rounded > values, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+
+class PackedForest:
+    """
+    Random forest flattened into struct-of-arrays node tables
+
+    Each tree's nodes are stored in hot_path_order, so the likely path
+    through a tree is mostly contiguous memory, and every tree starts on a
+    cache-line block. Leaves (and padding) point back at themselves, which
+    lets predict_proba advance all trees one level per step without
+    per-tree branching.
+    """
+
+    def __init__(self, model):
+        self.n_features_in_ = model.n_features_in_
+        self.classes_ = model.classes_
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        self.max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            order = hot_path_order(tree)
+            n_nodes = len(order)
+            n_slots = -(-n_nodes // NODES_PER_BLOCK) * NODES_PER_BLOCK
+
+            # Old node id -> slot in the packed tables
+            slot = np.empty(tree.node_count, dtype=np.int64)
+            slot[order] = offset + np.arange(n_nodes)
+            own_slot = offset + np.arange(n_slots)
+
+            is_leaf = tree.children_left[order] == -1
+            left = np.where(is_leaf, own_slot[:n_nodes], slot[np.maximum(tree.children_left[order], 0)])
+            right = np.where(is_leaf, own_slot[:n_nodes], slot[np.maximum(tree.children_right[order], 0)])
+
+            # Per-node class probabilities (only read at leaves)
+            counts = tree.value[order, 0, :]
+            proba = counts / counts.sum(axis=1, keepdims=True)
+
+            pad = n_slots - n_nodes
+            features.append(np.concatenate([np.where(is_leaf, 0, tree.feature[order]), np.zeros(pad)]))
+            thresholds.append(np.concatenate([float32_at_most(tree.threshold[order]), np.zeros(pad)]))
+            lefts.append(np.concatenate([left, own_slot[n_nodes:]]))
+            rights.append(np.concatenate([right, own_slot[n_nodes:]]))
+            values.append(np.concatenate([proba, np.zeros((pad, proba.shape[1]))]))
+            roots.append(offset)
+
+            offset += n_slots
+            self.max_depth = max(self.max_depth, tree.max_depth)
+
+        self.feature = np.concatenate(features).astype(np.int16)
+        self.threshold = np.concatenate(thresholds).astype(np.float32)
+        self.left = np.concatenate(lefts).astype(np.int32)
+        self.right = np.concatenate(rights).astype(np.int32)
+        self.value = np.concatenate(values).astype(np.float32)
+        self.roots = np.array(roots, dtype=np.int32)
+
+    def _check_features(self, X):
+        """Raise ValueError, as scikit-learn does, when X does not have the columns the forest was trained on"""
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            n_features = X.shape[1] if X.ndim == 2 else X.ndim
+            raise ValueError(
+                f"X has {n_features} features, but {type(self).__name__} is expecting "
+                f"{self.n_features_in_} features as input."
+            )
+        return X
+
+    def _walk(self, X):
+        """Advance every (row, tree) pair one level per step until all reach a leaf; average leaf probabilities"""
+        rows = np.arange(len(X))[:, None]
+        nodes = np.tile(self.roots, (len(X), 1))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].mean(axis=1)
+
+    def predict_proba(self, X):
+        return self._walk(self._check_features(np.asarray(X, dtype=np.float32)))
+
+
+def quantization_params(X):
+    """
+    Per-feature (offset, scale) mapping the observed [min, max] of X onto the int16 range
+
+    Returns:
+        tuple: (offset, scale) float64 arrays, one entry per feature
+    """
+    X = np.asarray(X, dtype=np.float64)
+    offset = X.min(axis=0)
+    span = X.max(axis=0) - offset
+    scale = np.where(span > 0, 65535.0 / np.where(span > 0, span, 1.0), 1.0)
+    return offset, scale
+
+
+def quantize(values, offset, scale):
+    """Map values onto int16 buckets; monotonic, so 'x <= t' implies 'q(x) <= q(t)'"""
+    buckets = np.floor((np.asarray(values, dtype=np.float64) - offset) * scale) - 32768
+    return np.clip(buckets, -32768, 32767).astype(np.int16)
+
+
+class QuantizedForest(PackedForest):
+    """
+    PackedForest with int16 thresholds compared against int16-quantized inputs
+
+    Halves the bytes fetched per node visit. Inputs falling in the same
+    bucket as a split threshold may take the other branch, so scores can
+    differ slightly from the float model.
+    """
+
+    def __init__(self, model, offset, scale):
+        super().__init__(model)
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.threshold = quantize(self.threshold, self.offset[self.feature], self.scale[self.feature])
+
+    def predict_proba(self, X):
+        X = self._check_features(np.asarray(X, dtype=np.float64))
+        return self._walk(quantize(X, self.offset, self.scale))
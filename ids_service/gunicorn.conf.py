@@ -0,0 +1,14 @@
+"""
+Gunicorn settings for the IDS service
+Run with: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("IDS_BIND", "0.0.0.0:6000")
+worker_class = "gevent"
+workers = int(os.environ.get("IDS_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+
+# Import app.py (and load the models) once in the master; workers inherit them copy-on-write
+preload_app = True
@@ -1,50 +1,114 @@
+import math
+import threading
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
+
+# Base handshake features and their defaults, in the order the models were trained on
+HANDSHAKE_BASE_FEATURES = (
+    ('handshake_duration', 0),
+    ('key_size', 256),
+    ('signature_valid', True),
+    ('client_entropy', 0),
+    ('server_entropy', 0),
+    ('retry_count', 0),
+    ('timestamp_hour', 12),
+    ('ip_reputation', 0.5),
+    ('geolocation_risk', 0.2),
+    ('protocol_version', 1.0),
+)
+
+HANDSHAKE_COLS = tuple(col for col, _ in HANDSHAKE_BASE_FEATURES) + (
+    'entropy_diff', 'entropy_ratio', 'duration_per_byte', 'risk_composite', 'retry_ratio'
+)
+
+# Base file features and their defaults, in the order the models were trained on
+FILE_BASE_FEATURES = (
+    ('file_size', 0),
+    ('file_entropy', 0),
+    ('file_type_risk', 0.2),
+    ('encryption_strength', 256),
+    ('upload_duration', 1.0),
+    ('compression_ratio', 1.0),
+    ('metadata_anomaly', 0),
+    ('transfer_speed', 1000),
+    ('packet_loss', 0.0),
+    ('concurrent_uploads', 1),
+)
+
+FILE_COLS = tuple(col for col, _ in FILE_BASE_FEATURES) + (
+    'size_log', 'entropy_per_byte', 'speed_per_mb', 'risk_score',
+    'suspicious_ratio', 'high_entropy', 'low_entropy', 'suspicious_size'
+)
+
+# Fields a payload must carry to be scored; the rest fall back to the defaults above
+HANDSHAKE_REQUIRED = ('handshake_duration', 'client_entropy', 'server_entropy')
+FILE_REQUIRED = ('file_size', 'file_entropy')
+
+# (anomaly_score, verdict) returned for payloads that cannot be scored
+SAFE_DEFAULT = (0.1, "normal")
+
+# Anomaly score above which a verdict is "suspicious"; the lower one applies when a risk indicator is present
+_THRESH_LOW, _THRESH_DEFAULT = 0.25, 0.35
+
+# Risk indicators that switch to the lower threshold
+_LOW_IP_REPUTATION = 0.3
+_HIGH_FILE_ENTROPY = 7.8
+_HIGH_FILE_TYPE_RISK = 0.7
+_HIGH_METADATA_ANOMALY = 5.0
+
+# Per-thread model input rows, reused across requests instead of building a DataFrame each time
+_row_buffers = threading.local()
+
+def _row_buffer(name, width):
+    """Return this thread's reusable (1, width) float32 model input row"""
+    row = getattr(_row_buffers, name, None)
+    if row is None:
+        row = np.empty((1, width), dtype=np.float32)
+        setattr(_row_buffers, name, row)
+    return row
 
 def extract_enhanced_handshake_features(features):
-    """Extract enhanced features from handshake data"""
-    enhanced = features.copy()
+    """Extract enhanced features from handshake data into this thread's (1, len(HANDSHAKE_COLS)) model row"""
+    base = [float(features.get(col, default)) for col, default in HANDSHAKE_BASE_FEATURES]
+    (handshake_duration, key_size, _, client_entropy, server_entropy,
+     retry_count, _, ip_reputation, geolocation_risk, _) = base
     
     # Derived features
-    enhanced['entropy_diff'] = abs(enhanced.get('client_entropy', 0) - enhanced.get('server_entropy', 0))
-    enhanced['entropy_ratio'] = enhanced.get('client_entropy', 0) / (enhanced.get('server_entropy', 0) + 1e-10)
-    enhanced['duration_per_byte'] = enhanced.get('handshake_duration', 0) / (enhanced.get('key_size', 256) + 1)
-    enhanced['risk_composite'] = (enhanced.get('ip_reputation', 0.5) + enhanced.get('geolocation_risk', 0.2)) / 2
-    enhanced['retry_ratio'] = enhanced.get('retry_count', 0) / (enhanced.get('handshake_duration', 0) + 1)
-    
-    return enhanced
+    row = _row_buffer('handshake', len(HANDSHAKE_COLS))
+    row[0] = base + [
+        abs(client_entropy - server_entropy),                # entropy_diff
+        client_entropy / (server_entropy + 1e-10),           # entropy_ratio
+        handshake_duration / (key_size + 1),                 # duration_per_byte
+        (ip_reputation + geolocation_risk) / 2,              # risk_composite
+        retry_count / (handshake_duration + 1),              # retry_ratio
+    ]
+    return row
 
 def extract_enhanced_file_features(features):
-    """Extract enhanced features from file data"""
-    enhanced = features.copy()
+    """Extract enhanced features from file data into this thread's (1, len(FILE_COLS)) model row"""
+    base = [float(features.get(col, default)) for col, default in FILE_BASE_FEATURES]
+    (file_size, file_entropy, file_type_risk, _, _, _,
+     metadata_anomaly, transfer_speed, packet_loss, _) = base
+    
+    file_size_mb = file_size / (1024 * 1024)
     
     # Derived features
-    import math
-    enhanced['size_log'] = math.log1p(enhanced.get('file_size', 0))
-    enhanced['entropy_per_byte'] = enhanced.get('file_entropy', 0) / (enhanced.get('file_size', 1) + 1)
-    
-    file_size_mb = enhanced.get('file_size', 0) / (1024 * 1024)
-    enhanced['speed_per_mb'] = enhanced.get('transfer_speed', 1000) / (file_size_mb + 1)
-    
-    enhanced['risk_score'] = (
-        enhanced.get('file_type_risk', 0.2) * 0.3 +
-        (enhanced.get('file_entropy', 0) / 8.0) * 0.3 +
-        (enhanced.get('metadata_anomaly', 0) / 10.0) * 0.2 +
-        min(enhanced.get('packet_loss', 0), 1.0) * 0.2
-    )
-    
-    enhanced['suspicious_ratio'] = (
-        enhanced.get('file_entropy', 0) / 8.0 +
-        enhanced.get('metadata_anomaly', 0) / 10.0
-    ) / 2
-    
-    # Flags
-    enhanced['high_entropy'] = int(enhanced.get('file_entropy', 0) > 7.5)
-    enhanced['low_entropy'] = int(enhanced.get('file_entropy', 0) < 3.0)
-    enhanced['suspicious_size'] = int(enhanced.get('file_size', 0) > 50 * 1024 * 1024)
-    
-    return enhanced
+    row = _row_buffer('file', len(FILE_COLS))
+    row[0] = base + [
+        math.log1p(file_size),                               # size_log
+        file_entropy / (file_size + 1),                      # entropy_per_byte
+        transfer_speed / (file_size_mb + 1),                 # speed_per_mb
+        (file_type_risk * 0.3 +                              # risk_score
+         (file_entropy / 8.0) * 0.3 +
+         (metadata_anomaly / 10.0) * 0.2 +
+         min(packet_loss, 1.0) * 0.2),
+        (file_entropy / 8.0 + metadata_anomaly / 10.0) / 2,  # suspicious_ratio
+        
+        # Flags
+        float(file_entropy > 7.5),                           # high_entropy
+        float(file_entropy < 3.0),                           # low_entropy
+        float(file_size > 50 * 1024 * 1024),                 # suspicious_size
+    ]
+    return row
 
 def predict_handshake(features, model):
     """
@@ -57,47 +121,37 @@ def predict_handshake(features, model):
     Returns:
         tuple: (anomaly_score, verdict)
     """
+    # Validate up front instead of raising and catching on malformed payloads
+    if not isinstance(features, dict) or any(col not in features for col in HANDSHAKE_REQUIRED):
+        return SAFE_DEFAULT
+    
+    # Numeric conversion, zero denominators and non-finite features are the only failures left on bad input
     try:
-        # Extract enhanced features
-        enhanced_features = extract_enhanced_handshake_features(features)
-        
-        # Convert to DataFrame with all expected columns
-        expected_cols = [
-            'handshake_duration', 'key_size', 'signature_valid', 'client_entropy',
-            'server_entropy', 'retry_count', 'timestamp_hour', 'ip_reputation',
-            'geolocation_risk', 'protocol_version', 'entropy_diff', 'entropy_ratio',
-            'duration_per_byte', 'risk_composite', 'retry_ratio'
-        ]
+        # Extract enhanced features straight into the model input row
+        row = extract_enhanced_handshake_features(features)
+        if not np.isfinite(row).all():
+            # e.g. a value too large for float32; the models were never trained on inf/nan
+            raise ValueError("derived features are not finite")
         
-        # Create DataFrame with all expected columns
-        feature_dict = {}
-        for col in expected_cols:
-            feature_dict[col] = enhanced_features.get(col, 0)
-        
-        feature_df = pd.DataFrame([feature_dict])
-        
-        # Get prediction probability
-        if hasattr(model, 'predict_proba'):
-            probabilities = model.predict_proba(feature_df)
-            anomaly_score = probabilities[0][1] if len(probabilities[0]) > 1 else probabilities[0][0]
-        else:
-            anomaly_score = model.predict(feature_df)[0]
-        
-        # Adaptive threshold based on risk indicators
-        base_threshold = 0.35
-        if enhanced_features.get('signature_valid', True) == False:
-            base_threshold = 0.25  # Lower threshold if signature invalid
-        if enhanced_features.get('ip_reputation', 0.5) < 0.3:
-            base_threshold = 0.25  # Lower threshold for low reputation
-        
-        verdict = "suspicious" if anomaly_score > base_threshold else "normal"
-        
-        return float(anomaly_score), verdict
-    
-    except Exception as e:
-        print(f"Error in handshake prediction: {e}")
-        # Return safe defaults
-        return 0.1, "normal"
+        # Adaptive threshold: lower if the signature is invalid or the IP reputation is low
+        base_threshold = _THRESH_LOW if (
+            features.get('signature_valid', True) == False or
+            float(features.get('ip_reputation', 0.5)) < _LOW_IP_REPUTATION
+        ) else _THRESH_DEFAULT
+    except (TypeError, ValueError, ZeroDivisionError) as e:
+        print(f"Invalid handshake features: {e}")
+        return SAFE_DEFAULT
+    
+    # Get prediction probability
+    if hasattr(model, 'predict_proba'):
+        probabilities = model.predict_proba(row)
+        anomaly_score = probabilities[0][1] if len(probabilities[0]) > 1 else probabilities[0][0]
+    else:
+        anomaly_score = model.predict(row)[0]
+    
+    verdict = "suspicious" if anomaly_score > base_threshold else "normal"
+    
+    return float(anomaly_score), verdict
 
 def predict_file(features, model):
     """
@@ -110,50 +164,38 @@ def predict_file(features, model):
     Returns:
         tuple: (anomaly_score, verdict)
     """
+    # Validate up front instead of raising and catching on malformed payloads
+    if not isinstance(features, dict) or any(col not in features for col in FILE_REQUIRED):
+        return SAFE_DEFAULT
+    
+    # Numeric conversion, zero denominators and non-finite features are the only failures left on bad input
     try:
-        # Extract enhanced features
-        enhanced_features = extract_enhanced_file_features(features)
+        # Extract enhanced features straight into the model input row
+        row = extract_enhanced_file_features(features)
+        if not np.isfinite(row).all():
+            # e.g. a value too large for float32; the models were never trained on inf/nan
+            raise ValueError("derived features are not finite")
         
-        # Convert to DataFrame with all expected columns
-        expected_cols = [
-            'file_size', 'file_entropy', 'file_type_risk', 'encryption_strength',
-            'upload_duration', 'compression_ratio', 'metadata_anomaly',
-            'transfer_speed', 'packet_loss', 'concurrent_uploads',
-            'size_log', 'entropy_per_byte', 'speed_per_mb', 'risk_score',
-            'suspicious_ratio', 'high_entropy', 'low_entropy', 'suspicious_size'
-        ]
-        
-        # Create DataFrame with all expected columns
-        feature_dict = {}
-        for col in expected_cols:
-            feature_dict[col] = enhanced_features.get(col, 0)
-        
-        feature_df = pd.DataFrame([feature_dict])
-        
-        # Get prediction probability
-        if hasattr(model, 'predict_proba'):
-            probabilities = model.predict_proba(feature_df)
-            anomaly_score = probabilities[0][1] if len(probabilities[0]) > 1 else probabilities[0][0]
-        else:
-            anomaly_score = model.predict(feature_df)[0]
-        
-        # Adaptive threshold based on risk indicators
-        base_threshold = 0.35
-        if enhanced_features.get('file_entropy', 0) > 7.8:
-            base_threshold = 0.25  # Lower threshold for high entropy
-        if enhanced_features.get('file_type_risk', 0.2) > 0.7:
-            base_threshold = 0.25  # Lower threshold for high type risk
-        if enhanced_features.get('metadata_anomaly', 0) > 5.0:
-            base_threshold = 0.25  # Lower threshold for high metadata anomaly
-        
-        verdict = "suspicious" if anomaly_score > base_threshold else "normal"
-        
-        return float(anomaly_score), verdict
-    
-    except Exception as e:
-        print(f"Error in file prediction: {e}")
-        # Return safe defaults
-        return 0.1, "normal"
+        # Adaptive threshold: lower for high entropy, high type risk or high metadata anomaly
+        base_threshold = _THRESH_LOW if (
+            float(features['file_entropy']) > _HIGH_FILE_ENTROPY or
+            float(features.get('file_type_risk', 0.2)) > _HIGH_FILE_TYPE_RISK or
+            float(features.get('metadata_anomaly', 0)) > _HIGH_METADATA_ANOMALY
+        ) else _THRESH_DEFAULT
+    except (TypeError, ValueError, ZeroDivisionError) as e:
+        print(f"Invalid file features: {e}")
+        return SAFE_DEFAULT
+    
+    # Get prediction probability
+    if hasattr(model, 'predict_proba'):
+        probabilities = model.predict_proba(row)
+        anomaly_score = probabilities[0][1] if len(probabilities[0]) > 1 else probabilities[0][0]
+    else:
+        anomaly_score = model.predict(row)[0]
+    
+    verdict = "suspicious" if anomaly_score > base_threshold else "normal"
+    
+    return float(anomaly_score), verdict
 
 def create_dummy_models():
     """
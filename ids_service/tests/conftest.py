@@ -0,0 +1,35 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+# The service modules import each other as top-level modules (see app.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Widest model row used by the tests (the file model's FILE_COLS)
+N_FEATURES = 18
+
+
+@pytest.fixture(scope='session')
+def training_data():
+    """(X, y) float32 training set of N_FEATURES columns; the label depends on the first three"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, N_FEATURES)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int)
+    return X, y
+
+
+@pytest.fixture(scope='session')
+def fitted_forest(training_data):
+    """fitted_forest(n_features=6, forest=RandomForestClassifier): small forest fitted on the first n_features columns, cached per session"""
+    X, y = training_data
+    forests = {}
+
+    def fit(n_features=6, forest=RandomForestClassifier):
+        if (n_features, forest) not in forests:
+            forests[n_features, forest] = forest(n_estimators=10, max_depth=8, random_state=0).fit(X[:, :n_features], y)
+        return forests[n_features, forest]
+
+    return fit
@@ -0,0 +1,39 @@
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingClassifier
+
+import backends
+
+
+@pytest.fixture(scope='module')
+def models(training_data, fitted_forest):
+    """A random forest and a histogram boosting model, both on the first 6 columns"""
+    X, y = training_data
+    return [
+        fitted_forest(),
+        HistGradientBoostingClassifier(max_iter=20, max_depth=4, random_state=0).fit(X[:, :6], y),
+    ]
+
+
+@pytest.mark.parametrize('model_index', [0, 1], ids=['random_forest', 'hist_gradient_boosting'])
+@pytest.mark.parametrize('backend, export, suffix, predictor', [
+    ('treelite', backends.export_treelite, 'so', backends.TreelitePredictor),
+    ('onnx', backends.export_onnx, 'onnx', backends.OnnxPredictor),
+])
+def test_exported_backend_matches_sklearn(tmp_path, training_data, models, backend, export, suffix, predictor, model_index):
+    X = training_data[0][:, :6]
+    model = models[model_index]
+    joblib.dump(model, tmp_path / 'm_model.pkl')
+    if not export(model, str(tmp_path / f'm_model.{suffix}')):
+        pytest.skip(f'{backend} export unavailable for {type(model).__name__}')
+    loaded = backends.load_model(str(tmp_path), 'm', backend=backend)
+    assert isinstance(loaded, predictor)
+    np.testing.assert_allclose(loaded.predict_proba(X), model.predict_proba(X), atol=1e-5)
+
+
+def test_sklearn_fallback_without_exports(tmp_path, training_data, models):
+    X = training_data[0][:, :6]
+    joblib.dump(models[1], tmp_path / 'file_model.pkl')
+    loaded = backends.load_model(str(tmp_path), 'file', backend='sklearn')
+    np.testing.assert_array_equal(loaded.predict_proba(X), models[1].predict_proba(X))
@@ -0,0 +1,60 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from batching import BatchingModel
+
+
+class EchoModel:
+    """Returns each row's first two columns as its 'probabilities' and records the batch sizes it saw"""
+
+    n_features_in_ = 3
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict_proba(self, X):
+        self.batch_sizes.append(len(X))
+        return X[:, :2].copy()
+
+
+def test_concurrent_callers_get_their_own_rows():
+    model = EchoModel()
+    batching = BatchingModel(model, max_batch=8, max_wait=0.05)
+    n_callers = 32
+    barrier = threading.Barrier(n_callers)
+
+    def call(i):
+        row = np.array([[i, -i, 0]], dtype=np.float32)
+        barrier.wait()
+        return batching.predict_proba(row)
+
+    with ThreadPoolExecutor(max_workers=n_callers) as executor:
+        results = list(executor.map(call, range(n_callers)))
+
+    for i, result in enumerate(results):
+        np.testing.assert_array_equal(result, [[i, -i]])
+    assert sum(model.batch_sizes) == n_callers
+    assert max(model.batch_sizes) <= 8
+
+
+def test_model_errors_reach_every_caller():
+    class FailingModel:
+        n_features_in_ = 3
+
+        def predict_proba(self, X):
+            raise ValueError("bad rows")
+
+    with pytest.raises(ValueError, match="bad rows"):
+        BatchingModel(FailingModel()).predict_proba(np.zeros((1, 3)))
+
+
+def test_lone_request_is_not_delayed():
+    batching = BatchingModel(EchoModel(), max_wait=1.0)
+    batching.predict_proba(np.zeros((1, 3)))  # starts the worker thread
+    start = time.monotonic()
+    batching.predict_proba(np.zeros((1, 3)))
+    assert time.monotonic() - start < 0.5
@@ -0,0 +1,17 @@
+import numpy as np
+
+from enhanced_train import calculate_entropy
+
+
+def test_entropy_of_bytes():
+    assert calculate_entropy(np.frombuffer(b'abcd' * 4, dtype=np.uint8)) == 2.0
+
+
+def test_entropy_of_large_integers():
+    # Counting by bincount would allocate 10**12 slots here
+    assert calculate_entropy(np.array([0, 10**12])) == 1.0
+
+
+def test_entropy_of_floats_and_negatives():
+    assert calculate_entropy(np.array([-1, -1, 2, 2])) == 1.0
+    assert calculate_entropy(np.array([0.5, 0.5])) == 0.0
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+
+import forest_layout
+
+
+def new_rows(n_features=6):
+    return np.random.default_rng(1).normal(size=(100, n_features)).astype(np.float32)
+
+
+@pytest.mark.parametrize('forest', [RandomForestClassifier, ExtraTreesClassifier])
+def test_packed_forest_matches_sklearn(fitted_forest, forest):
+    model = fitted_forest(forest=forest)
+    X_new = new_rows()
+    packed = forest_layout.PackedForest(model)
+    np.testing.assert_allclose(packed.predict_proba(X_new), model.predict_proba(X_new), atol=1e-6)
+
+
+def test_quantized_forest_close_to_sklearn(training_data, fitted_forest):
+    X, _ = training_data
+    model = fitted_forest()
+    quantized = forest_layout.QuantizedForest(model, *forest_layout.quantization_params(X[:, :6]))
+    X_new = new_rows()
+    # Only inputs in the same int16 bucket as a threshold can take the other branch
+    np.testing.assert_allclose(quantized.predict_proba(X_new), model.predict_proba(X_new), atol=0.05)
+
+
+def test_feature_count_mismatch_raises(training_data, fitted_forest):
+    X, _ = training_data
+    model = fitted_forest()
+    for forest in (forest_layout.PackedForest(model),
+                   forest_layout.QuantizedForest(model, *forest_layout.quantization_params(X[:, :6]))):
+        with pytest.raises(ValueError, match='features'):
+            forest.predict_proba(np.zeros((1, 7)))
@@ -0,0 +1,21 @@
+from inference import HANDSHAKE_COLS, FILE_COLS, SAFE_DEFAULT, predict_handshake, predict_file
+
+
+HANDSHAKE = {'handshake_duration': 120, 'client_entropy': 7.2, 'server_entropy': 7.0, 'key_size': 256}
+
+
+def test_handshake_is_scored(fitted_forest):
+    score, verdict = predict_handshake(HANDSHAKE, fitted_forest(len(HANDSHAKE_COLS)))
+    assert 0.0 <= score <= 1.0
+    assert verdict in ('normal', 'suspicious')
+
+
+def test_handshake_zero_denominator_returns_safe_default(fitted_forest):
+    model = fitted_forest(len(HANDSHAKE_COLS))
+    assert predict_handshake({**HANDSHAKE, 'key_size': -1}, model) == SAFE_DEFAULT
+    assert predict_handshake({**HANDSHAKE, 'handshake_duration': -1, 'retry_count': 2}, model) == SAFE_DEFAULT
+
+
+def test_file_zero_denominator_returns_safe_default(fitted_forest):
+    model = fitted_forest(len(FILE_COLS))
+    assert predict_file({'file_size': -1, 'file_entropy': 4.0}, model) == SAFE_DEFAULT
@@ -2,102 +2,459 @@
 """
 Comprehensive Test Suite for Secure Transfer System
 Tests normal operations and attack scenarios
+
+Run sequentially:         python run_all_tests.py
+Run in parallel (pytest): pytest -n auto --dist=loadgroup run_all_tests.py
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import asyncio
+import atexit
 import base64
+import contextvars
+import io
+import itertools
 import os
+import sys
 import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from io import BytesIO
 
+# pytest is optional; without it the script still runs through main()
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+# orjson parses response bodies several times faster than the stdlib json behind response.json(),
+# and serializes the request bodies that are built ahead of time; optional
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+    def _json_dumps(obj):
+        return json.dumps(obj).encode()
+
+# requests-toolbelt streams multipart uploads instead of building the whole body in memory; optional
+try:
+    from requests_toolbelt import MultipartEncoder
+except ImportError:
+    MultipartEncoder = None
+
+# httpx (with the h2 extra) runs the TC-IDS1 handshake burst on one async client; optional
+try:
+    import httpx
+    import h2  # noqa: F401  (needed for http2=True)
+except ImportError:
+    httpx = None
+
 # Configuration
 SERVER_URL = os.environ.get("SERVER_URL", "http://localhost:5000/api")
 IDS_URL = os.environ.get("IDS_URL", "http://localhost:6000")
 TEST_EMAIL = "test@example.com"
 TEST_PASSWORD = "Test123!@#"
 
+# Request bodies serialized once and sent with data= instead of re-encoding a dict through json= per call
+JSON_HEADERS = {"Content-Type": "application/json"}
+LOGIN_BODY = _json_dumps({"email": TEST_EMAIL, "password": TEST_PASSWORD})
+
+# TC-A8 upload size; the body repeats a small block (the server only needs the size, not entropy)
+LARGE_PAYLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+
+# Valid-size (32-byte) public keys generated once; tests cycle through them instead of calling the CSPRNG
+_PUBKEY_POOL = [base64.b64encode(os.urandom(32)).decode() for _ in range(16)]
+_pubkey_cycle = itertools.cycle(_PUBKEY_POOL)
+
+# One keep-alive connection pool shared by every request, instead of a new connection per call
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
 # Test results
 test_results = {
     "passed": 0,
     "failed": 0,
+    "skipped": 0,
     "warnings": 0
 }
+# Independent tests run on worker threads; this guards test_results
+_results_lock = threading.Lock()
+
+# Report lines are queued and written in batches (one write call each) instead of a print per line
+_LOG = []
+_log_lock = threading.Lock()
+
+# Buffer of the test running in this thread, if any; its header and results are queued as one block when it ends
+_test_output = contextvars.ContextVar("test_output", default=None)
+
+def flush_log():
+    """Write every queued report line with a single write call"""
+    with _log_lock:
+        if _LOG:
+            sys.stdout.write("\n".join(_LOG) + "\n")
+            sys.stdout.flush()
+            _LOG.clear()
+
+atexit.register(flush_log)
+
+def log(line=""):
+    """Add one report line to the current test's buffer, or queue it directly outside a buffered test"""
+    buf = _test_output.get()
+    if buf is not None:
+        buf.write(line + "\n")
+        return
+    with _log_lock:
+        _LOG.append(line)
+    if "PYTEST_CURRENT_TEST" in os.environ:
+        flush_log()  # keep output with the test pytest is capturing
+
+def run_buffered(test):
+    """
+    Run a test with its report lines held in its own buffer instead of the shared queue
+
+    Returns:
+        tuple: (test result, the test's report lines as one block)
+    """
+    buf = io.StringIO()
+    token = _test_output.set(buf)  # pool threads are reused, so the buffer is unset again afterwards
+    try:
+        return test(), buf.getvalue().rstrip("\n")
+    finally:
+        _test_output.reset(token)
+
+def log_block(block):
+    """Queue a finished test's report lines together"""
+    if block:
+        with _log_lock:
+            _LOG.append(block)
 
 def print_header(title):
-    print(f"\n{'='*60}")
-    print(f"  {title}")
-    print(f"{'='*60}")
+    log(f"\n{'='*60}")
+    log(f"  {title}")
+    log(f"{'='*60}")
 
 def print_result(test_name, passed, message=""):
     status = "✅ PASS" if passed else "❌ FAIL"
-    print(f"{status} - {test_name}")
-    if message:
-        print(f"    {message}")
-    if passed:
-        test_results["passed"] += 1
-    else:
-        test_results["failed"] += 1
+    with _results_lock:
+        log(f"{status} - {test_name}")
+        if message:
+            log(f"    {message}")
+        if passed:
+            test_results["passed"] += 1
+        else:
+            test_results["failed"] += 1
+    # Under pytest the check itself must fail so xdist can report it
+    if not passed and pytest is not None and "PYTEST_CURRENT_TEST" in os.environ:
+        pytest.fail(f"{test_name}: {message}", pytrace=False)
 
 def print_warning(message):
-    print(f"⚠️  WARNING - {message}")
-    test_results["warnings"] += 1
+    with _results_lock:
+        log(f"⚠️  WARNING - {message}")
+        test_results["warnings"] += 1
+
+def print_skipped(test_name, failed_deps):
+    with _results_lock:
+        log(f"⏭️  SKIP - {test_name}")
+        log(f"    Needs: {', '.join(failed_deps)}")
+        test_results["skipped"] += 1
 
 # ==================== Helper Functions ====================
 
+class RepeatingReader:
+    """File-like body of `size` bytes made by repeating one small block, so no large buffer is ever built"""
+    
+    def __init__(self, size, block=b"A" * 65536):
+        self.remaining = size
+        self.block = block
+    
+    def __len__(self):
+        # Bytes still unread; MultipartEncoder uses this to size and finish the part
+        return self.remaining
+    
+    def read(self, n=-1):
+        n = self.remaining if n is None or n < 0 else min(n, self.remaining)
+        self.remaining -= n
+        repeats, extra = divmod(n, len(self.block))
+        return self.block * repeats + self.block[:extra]
+
+def upload_file(filename, body, content_type, **kwargs):
+    """POST body as the multipart 'file' field of /files/upload, streamed through MultipartEncoder when available"""
+    if MultipartEncoder is None:
+        return SESSION.post(f"{SERVER_URL}/files/upload", files={'file': (filename, body, content_type)},
+                            headers=auth_headers(), **kwargs)
+    encoder = MultipartEncoder(fields={'file': (filename, body, content_type)})
+    return SESSION.post(f"{SERVER_URL}/files/upload", data=encoder,
+                        headers={**auth_headers(), "Content-Type": encoder.content_type}, **kwargs)
+
+def fresh_pubkey():
+    """Next public key from the pool; a run uses fewer than 16, so none repeats within a run"""
+    return next(_pubkey_cycle)
+
+def jload(response):
+    """Parsed JSON body of a requests or httpx response"""
+    return _json_loads(response.content)
+
+def error_text(response, limit=200):
+    """First bytes of a failed response's body for the report; skips charset detection over the whole body"""
+    return response.content[:limit].decode("utf-8", "replace")
+
+def discard(response):
+    """Drop an unread stream=True body without decoding it; drain_conn hands the connection back to the pool"""
+    response.raw.drain_conn()
+    response.close()
+
+# Monitoring lists fetched together through POST /batch; their sizes are shared by TC-8 and TC-9
+MONITORING_URLS = ("/alerts", "/logs/connections")
+_monitoring_results = {}
+_monitoring_lock = threading.Lock()
+
+# Last login token, its JWT expiry and the prebuilt headers, so only the first caller hits /auth/login
+_TOKEN_CACHE = {"token": None, "exp": 0, "headers": {}, "json_headers": dict(JSON_HEADERS)}
+
+# /health results (Response, or the connection error), probed once per run for the preflight and TC-1/TC-2
+_BE_HEALTH = None
+_IDS_HEALTH = None
+
+def jwt_expiry(token):
+    """exp claim of a JWT (seconds since epoch); inf if it has none, 0 if it cannot be decoded"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return claims.get("exp", float("inf"))
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+def cache_token(token):
+    """Remember a freshly issued token for get_auth_token / auth_headers"""
+    headers = {"Authorization": f"Bearer {token}"}
+    _TOKEN_CACHE.update(token=token, exp=jwt_expiry(token), headers=headers, json_headers={**headers, **JSON_HEADERS})
+
 def get_auth_token():
-    """Get authentication token"""
+    """Get authentication token, logging in only when there is no unexpired cached one"""
+    if _TOKEN_CACHE["token"] and time.time() < _TOKEN_CACHE["exp"] - 5:
+        return _TOKEN_CACHE["token"]
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{SERVER_URL}/auth/login",
-            json={"email": TEST_EMAIL, "password": TEST_PASSWORD},
+            data=LOGIN_BODY,
+            headers=JSON_HEADERS,
             timeout=5
         )
         if response.status_code == 200:
-            return response.json().get("token")
+            token = jload(response).get("token")
+            cache_token(token)
+            return token
         return None
     except Exception as e:
         print_warning(f"Cannot get auth token: {e}")
         return None
 
+async def run_ids_brute(init_bodies):
+    """
+    Send a burst of handshake inits, then validate every accepted one, on one httpx.AsyncClient
+
+    Over https the requests are multiplexed on a single HTTP/2 connection;
+    plain http stays on HTTP/1.1 (no h2c), with one pooled connection each.
+
+    Returns:
+        list: validate responses
+    """
+    async with httpx.AsyncClient(http2=True, base_url=SERVER_URL, headers=auth_headers(), timeout=5) as client:
+        inits = await asyncio.gather(*[
+            client.post("/handshake/init", content=body, headers=JSON_HEADERS) for body in init_bodies
+        ])
+        handshake_ids = [jload(r).get("handshakeId") for r in inits if r.status_code == 200]
+        return await asyncio.gather(*[client.post("/handshake/validate", json={"handshakeId": h}) for h in handshake_ids])
+
+def fetch_monitoring():
+    """
+    Fetch every MONITORING_URLS list in one POST /batch (one round trip, one token check)
+
+    Servers without /batch get concurrent plain GETs instead. Only each
+    list's length is kept, so the parsed lists are freed straight away.
+
+    Returns:
+        dict: url -> (status_code, number of items or None)
+    """
+    response = SESSION.post(
+        f"{SERVER_URL}/batch",
+        json=[{"method": "GET", "url": url} for url in MONITORING_URLS],
+        headers=auth_headers(),
+        timeout=5
+    )
+    if response.status_code == 200:
+        return {
+            url: (item["status"], len(item["body"]) if item["status"] == 200 else None)
+            for url, item in zip(MONITORING_URLS, jload(response))
+        }
+    if response.status_code != 404:
+        return {url: (response.status_code, None) for url in MONITORING_URLS}
+    
+    def get(url):
+        r = SESSION.get(f"{SERVER_URL}{url}", headers=auth_headers(), timeout=5)
+        return url, (r.status_code, len(jload(r)) if r.status_code == 200 else None)
+    
+    with ThreadPoolExecutor(max_workers=len(MONITORING_URLS)) as executor:
+        return dict(executor.map(get, MONITORING_URLS))
+
+def get_monitoring(url):
+    """(status_code, number of items) for a monitoring list; the first caller fetches them all"""
+    with _monitoring_lock:
+        if not _monitoring_results:
+            _monitoring_results.update(fetch_monitoring())
+    return _monitoring_results[url]
+
+def auth_headers():
+    """Authorization header for the cached token, logging in again if it is about to expire"""
+    get_auth_token()
+    return _TOKEN_CACHE["headers"]
+
+def auth_json_headers():
+    """auth_headers() plus the JSON Content-Type, for requests sending a prebuilt body with data="""
+    get_auth_token()
+    return _TOKEN_CACHE["json_headers"]
+
+def _safe_get(url):
+    """GET a URL, returning a connection error instead of raising it"""
+    try:
+        return SESSION.get(url, timeout=5)
+    except requests.RequestException as e:
+        return e
+
+def probe_health():
+    """Probe the backend and IDS /health endpoints concurrently, once per run"""
+    global _BE_HEALTH, _IDS_HEALTH
+    if _BE_HEALTH is None:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            _BE_HEALTH, _IDS_HEALTH = executor.map(_safe_get, [f"{SERVER_URL}/health", f"{IDS_URL}/health"])
+
+def get_health(service):
+    """Probed /health Response for "backend" or "ids"; raises the connection error if the probe failed"""
+    probe_health()
+    result = _BE_HEALTH if service == "backend" else _IDS_HEALTH
+    if isinstance(result, Exception):
+        raise result
+    return result
+
 def check_backend_health():
     """Check if backend is running"""
     try:
-        response = requests.get(f"{SERVER_URL}/health", timeout=2)
-        return response.status_code == 200
+        return get_health("backend").status_code == 200
     except:
         return False
 
 def check_ids_health():
     """Check if IDS service is running"""
     try:
-        response = requests.get(f"{IDS_URL}/health", timeout=2)
-        return response.status_code == 200
+        return get_health("ids").status_code == 200
     except:
         return False
 
+# ==================== Test Registry ====================
+
+# Test name -> (function, names of the tests whose results it is called with), in definition order
+TESTS = {}
+
+def register(name, deps=()):
+    """Add a test to TESTS for main(); it runs with its deps' results as arguments, or is skipped if one failed"""
+    def decorator(fn):
+        TESTS[name] = (fn, tuple(deps))
+        return fn
+    return decorator
+
+def run_tests(executor):
+    """
+    Run every registered test in waves: each wave is every test whose deps have finished, run concurrently
+
+    A test whose dependency failed or was skipped (a falsy result) is not
+    run and counts as skipped rather than failed.
+    Each test's header and results are buffered while it runs and written
+    as one block, so a wave's concurrent tests never interleave in the report.
+
+    Returns:
+        dict: test name -> result (None for skipped tests)
+    """
+    results = {}
+    pending = dict(TESTS)
+    while pending:
+        ready = [name for name, (_, deps) in pending.items() if all(dep in results for dep in deps)]
+        if not ready:
+            raise ValueError(f"Unknown or circular test dependencies: {sorted(pending)}")
+        runnable, blocks = {}, {}
+        for name in ready:
+            fn, deps = pending.pop(name)
+            failed_deps = [dep for dep in deps if not results[dep]]
+            if failed_deps:
+                results[name], blocks[name] = run_buffered(partial(print_skipped, name, failed_deps))
+            else:
+                runnable[name] = partial(fn, *[results[dep] for dep in deps])
+        # Every test runs with its own report buffer; the wave's blocks are queued in registration order
+        for name, (result, block) in zip(runnable, executor.map(run_buffered, runnable.values())):
+            results[name], blocks[name] = result, block
+        for name in ready:
+            log_block(blocks[name])
+        flush_log()
+    return results
+
+# ==================== pytest Integration ====================
+
+def xdist_group(name):
+    """Keep the marked tests on one pytest-xdist worker (--dist=loadgroup); no-op without pytest"""
+    return pytest.mark.xdist_group(name) if pytest is not None else (lambda fn: fn)
+
+if pytest is not None:
+    # Test functions return values for main(); pytest only needs them to pass
+    pytestmark = pytest.mark.filterwarnings("ignore::pytest.PytestReturnNotNoneWarning")
+
+    @pytest.fixture(scope="session")
+    def token():
+        """Bearer token for the test account, logged in once per worker; dependent tests skip without one"""
+        token = get_auth_token()
+        if not token:
+            pytest.skip("No auth token available")
+        return token
+
+    @pytest.fixture(scope="session")
+    def handshake_data(token):
+        """Handshake started once per worker, for the validation test"""
+        data = test_handshake_init(token)
+        if not data:
+            pytest.skip("No handshake data available")
+        return data
+
 # ==================== Test Cases ====================
 
+@register("backend_health")
 def test_backend_health():
     """TC-1: Backend Health Check"""
     print_header("TC-1: Backend Health Check")
     try:
-        response = requests.get(f"{SERVER_URL}/health", timeout=5)
+        response = get_health("backend")
         passed = response.status_code == 200
         print_result("Backend Health", passed, 
-                     f"Status: {response.status_code}, Response: {response.json() if passed else 'N/A'}")
+                     f"Status: {response.status_code}, Response: {jload(response) if passed else 'N/A'}")
         return passed
     except Exception as e:
         print_result("Backend Health", False, f"Error: {e}")
         return False
 
+@register("ids_health")
 def test_ids_health():
     """TC-2: IDS Service Health Check"""
     print_header("TC-2: IDS Service Health Check")
     try:
-        response = requests.get(f"{IDS_URL}/health", timeout=5)
+        response = get_health("ids")
         passed = response.status_code == 200
-        data = response.json() if passed else {}
+        data = jload(response) if passed else {}
         print_result("IDS Health", passed, 
                      f"Status: {response.status_code}, Models loaded: {data.get('models_loaded', False)}")
         if not passed:
@@ -108,38 +465,44 @@ def test_ids_health():
         print_warning("IDS service is not running - some tests may fail")
         return False
 
+@register("normal_login")
 def test_normal_login():
     """TC-3: Normal Login"""
     print_header("TC-3: Normal Login")
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{SERVER_URL}/auth/login",
-            json={"email": TEST_EMAIL, "password": TEST_PASSWORD},
+            data=LOGIN_BODY,
+            headers=JSON_HEADERS,
             timeout=5
         )
         passed = response.status_code == 200
         if passed:
-            data = response.json()
+            data = jload(response)
+            cache_token(data.get("token"))
             print_result("Normal Login", True, 
                         f"User: {data.get('user', {}).get('email', 'N/A')}, Token received: {bool(data.get('token'))}")
             return data.get("token")
         else:
-            print_result("Normal Login", False, f"Status: {response.status_code}, Error: {response.text}")
+            print_result("Normal Login", False, f"Status: {response.status_code}, Error: {error_text(response)}")
             return None
     except Exception as e:
         print_result("Normal Login", False, f"Error: {e}")
         return None
 
+@register("invalid_login")
 def test_invalid_login():
     """TC-4: Invalid Login Credentials"""
     print_header("TC-4: Invalid Login Credentials")
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{SERVER_URL}/auth/login",
             json={"email": TEST_EMAIL, "password": "wrongpassword"},
+            stream=True,  # status only; the body is never read
             timeout=5
         )
         passed = response.status_code == 401
+        discard(response)
         print_result("Invalid Login Rejected", passed, 
                     f"Status: {response.status_code} (expected 401)")
         return passed
@@ -147,51 +510,46 @@ def test_invalid_login():
         print_result("Invalid Login Rejected", False, f"Error: {e}")
         return False
 
+@register("handshake_init", deps=("normal_login",))
+@xdist_group("handshake")
 def test_handshake_init(token):
     """TC-5: Normal Handshake Initialization"""
     print_header("TC-5: Normal Handshake Initialization")
-    if not token:
-        print_result("Handshake Init", False, "No auth token available")
-        return None
-    
     try:
-        # Generate a valid X25519 public key (32 bytes base64)
-        valid_pubkey = base64.b64encode(os.urandom(32)).decode()
+        # A valid X25519 public key (32 bytes base64)
+        valid_pubkey = fresh_pubkey()
         
-        response = requests.post(
+        response = SESSION.post(
             f"{SERVER_URL}/handshake/init",
             json={"publicKey": valid_pubkey},
-            headers={"Authorization": f"Bearer {token}"},
+            headers=auth_headers(),
             timeout=5
         )
         passed = response.status_code == 200
         if passed:
-            data = response.json()
+            data = jload(response)
             print_result("Handshake Init", True, 
                         f"Handshake ID: {data.get('handshakeId', 'N/A')[:16]}..., Server key received: {bool(data.get('serverPublicKey'))}")
             return data
         else:
-            print_result("Handshake Init", False, f"Status: {response.status_code}, Error: {response.text}")
+            print_result("Handshake Init", False, f"Status: {response.status_code}, Error: {error_text(response)}")
             return None
     except Exception as e:
         print_result("Handshake Init", False, f"Error: {e}")
         return None
 
+@register("invalid_public_key", deps=("normal_login",))
 def test_invalid_public_key(token):
     """TC-A1: Invalid Public Key Attack"""
     print_header("TC-A1: Invalid Public Key Attack")
-    if not token:
-        print_result("Invalid Pubkey Attack", False, "No auth token available")
-        return False
-    
     try:
         # Send invalid public key (too short)
         invalid_pubkey = base64.b64encode(os.urandom(10)).decode()
         
-        response = requests.post(
+        response = SESSION.post(
             f"{SERVER_URL}/handshake/init",
             json={"publicKey": invalid_pubkey},
-            headers={"Authorization": f"Bearer {token}"},
+            headers=auth_headers(),
             timeout=5
         )
         # Should either reject or handle gracefully
@@ -203,53 +561,50 @@ def test_invalid_public_key(token):
         print_result("Invalid Pubkey Handled", False, f"Error: {e}")
         return False
 
+@register("handshake_validate", deps=("normal_login", "handshake_init"))
+@xdist_group("handshake")
 def test_handshake_validate(token, handshake_data):
     """TC-6: Normal Handshake Validation"""
     print_header("TC-6: Normal Handshake Validation")
-    if not token or not handshake_data:
-        print_result("Handshake Validate", False, "No handshake data available")
-        return None
-    
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{SERVER_URL}/handshake/validate",
             json={"handshakeId": handshake_data.get("handshakeId")},
-            headers={"Authorization": f"Bearer {token}"},
+            headers=auth_headers(),
             timeout=5
         )
         passed = response.status_code == 200
         if passed:
-            data = response.json()
+            data = jload(response)
             verified = data.get("verified", False)
             verdict = data.get("idsResult", {}).get("verdict", "unknown")
             print_result("Handshake Validate", True, 
                         f"Verified: {verified}, IDS Verdict: {verdict}, Session key received: {bool(data.get('sessionKey'))}")
             return data
         else:
-            print_result("Handshake Validate", False, f"Status: {response.status_code}, Error: {response.text}")
+            print_result("Handshake Validate", False, f"Status: {response.status_code}, Error: {error_text(response)}")
             return None
     except Exception as e:
         print_result("Handshake Validate", False, f"Error: {e}")
         return None
 
+@register("wrong_handshake_id", deps=("normal_login",))
 def test_wrong_handshake_id(token):
     """TC-A2: Wrong Handshake ID Attack"""
     print_header("TC-A2: Wrong Handshake ID Attack")
-    if not token:
-        print_result("Wrong Handshake ID", False, "No auth token available")
-        return False
-    
     try:
         # Send invalid handshake ID
         fake_id = "507f1f77bcf86cd799439011"  # Valid ObjectId format but non-existent
         
-        response = requests.post(
+        response = SESSION.post(
             f"{SERVER_URL}/handshake/validate",
             json={"handshakeId": fake_id},
-            headers={"Authorization": f"Bearer {token}"},
+            headers=auth_headers(),
+            stream=True,  # status only; the body is never read
             timeout=5
         )
         passed = response.status_code == 404
+        discard(response)
         print_result("Wrong Handshake ID Rejected", passed, 
                     f"Status: {response.status_code} (expected 404)")
         return passed
@@ -257,62 +612,38 @@ def test_wrong_handshake_id(token):
         print_result("Wrong Handshake ID Rejected", False, f"Error: {e}")
         return False
 
+@register("normal_file_upload", deps=("normal_login",))
 def test_normal_file_upload(token):
     """TC-7: Normal File Upload"""
     print_header("TC-7: Normal File Upload")
-    if not token:
-        print_result("Normal File Upload", False, "No auth token available")
-        return False
-    
     try:
         # Create a small test file
         test_content = b"This is a normal test file content for upload testing."
-        files = {
-            'file': ('test_normal.txt', BytesIO(test_content), 'text/plain')
-        }
-        
-        response = requests.post(
-            f"{SERVER_URL}/files/upload",
-            files=files,
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=10
-        )
+        response = upload_file('test_normal.txt', BytesIO(test_content), 'text/plain', timeout=10)
         
         passed = response.status_code == 200
         if passed:
-            data = response.json()
+            data = jload(response)
             status = data.get("status", "unknown")
             verdict = data.get("details", {}).get("verdict", "unknown") if isinstance(data.get("details"), dict) else "unknown"
             print_result("Normal File Upload", True, 
                         f"Status: {status}, IDS Verdict: {verdict}, File ID: {data.get('id', 'N/A')[:16]}...")
             return True
         else:
-            print_result("Normal File Upload", False, f"Status: {response.status_code}, Error: {response.text}")
+            print_result("Normal File Upload", False, f"Status: {response.status_code}, Error: {error_text(response)}")
             return False
     except Exception as e:
         print_result("Normal File Upload", False, f"Error: {e}")
         return False
 
+@register("large_file_upload", deps=("normal_login",))
 def test_large_file_upload(token):
     """TC-A8: Large Payload Attack"""
     print_header("TC-A8: Large Payload Attack")
-    if not token:
-        print_result("Large File Upload", False, "No auth token available")
-        return False
-    
     try:
-        # Create a large file (10MB)
-        large_content = os.urandom(10 * 1024 * 1024)  # 10MB
-        files = {
-            'file': ('large_file.bin', BytesIO(large_content), 'application/octet-stream')
-        }
-        
-        response = requests.post(
-            f"{SERVER_URL}/files/upload",
-            files=files,
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=30
-        )
+        # Stream a 10MB file without holding it in memory
+        response = upload_file('large_file.bin', RepeatingReader(LARGE_PAYLOAD_SIZE), 'application/octet-stream',
+                               timeout=30)
         
         # Should either reject or handle gracefully
         passed = response.status_code in [200, 400, 413, 500]
@@ -324,27 +655,18 @@ def test_large_file_upload(token):
         print_result("Large File Handled", False, f"Error: {e}")
         return False
 
+@register("empty_file_upload", deps=("normal_login",))
 def test_empty_file_upload(token):
     """TC-A9: Empty File Attack"""
     print_header("TC-A9: Empty File Attack")
-    if not token:
-        print_result("Empty File Upload", False, "No auth token available")
-        return False
-    
     try:
-        # Create an empty file
-        files = {
-            'file': ('empty.txt', BytesIO(b''), 'text/plain')
-        }
-        
-        response = requests.post(
-            f"{SERVER_URL}/files/upload",
-            files=files,
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=5
-        )
+        # Upload an empty file
+        response = upload_file('empty.txt', BytesIO(b''), 'text/plain',
+                               stream=True,  # status only; the body is never read
+                               timeout=5)
         
         passed = response.status_code == 400
+        discard(response)
         print_result("Empty File Rejected", passed, 
                     f"Status: {response.status_code} (expected 400)")
         return passed
@@ -352,17 +674,20 @@ def test_empty_file_upload(token):
         print_result("Empty File Rejected", False, f"Error: {e}")
         return False
 
+@register("unauthorized_access")
 def test_unauthorized_access():
     """TC-A10: Unauthorized Access Attempt"""
     print_header("TC-A10: Unauthorized Access Attempt")
     try:
         # Try to access protected endpoint without token
-        response = requests.post(
+        response = SESSION.post(
             f"{SERVER_URL}/handshake/init",
-            json={"publicKey": base64.b64encode(os.urandom(32)).decode()},
+            json={"publicKey": fresh_pubkey()},
+            stream=True,  # status only; the body is never read
             timeout=5
         )
         passed = response.status_code == 401
+        discard(response)
         print_result("Unauthorized Access Rejected", passed, 
                     f"Status: {response.status_code} (expected 401)")
         return passed
@@ -370,36 +695,41 @@ def test_unauthorized_access():
         print_result("Unauthorized Access Rejected", False, f"Error: {e}")
         return False
 
+@register("ids_handshake_detection", deps=("normal_login",))
 def test_ids_handshake_detection(token):
     """TC-IDS1: IDS Handshake Anomaly Detection"""
     print_header("TC-IDS1: IDS Handshake Anomaly Detection")
-    if not token:
-        print_result("IDS Handshake Detection", False, "No auth token available")
-        return False
+    def init(body):
+        return SESSION.post(
+            f"{SERVER_URL}/handshake/init",
+            data=body,
+            headers=auth_json_headers(),
+            timeout=5
+        )
+    
+    def validate(handshake_id):
+        return SESSION.post(
+            f"{SERVER_URL}/handshake/validate",
+            json={"handshakeId": handshake_id},
+            headers=auth_headers(),
+            timeout=5
+        )
     
     try:
-        # Try multiple rapid handshakes (potential brute force)
-        suspicious_count = 0
-        for i in range(5):
-            pubkey = base64.b64encode(os.urandom(32)).decode()
-            response = requests.post(
-                f"{SERVER_URL}/handshake/init",
-                json={"publicKey": pubkey},
-                headers={"Authorization": f"Bearer {token}"},
-                timeout=5
-            )
-            if response.status_code == 200:
-                data = response.json()
-                validate_resp = requests.post(
-                    f"{SERVER_URL}/handshake/validate",
-                    json={"handshakeId": data.get("handshakeId")},
-                    headers={"Authorization": f"Bearer {token}"},
-                    timeout=5
-                )
-                if validate_resp.status_code == 200:
-                    validate_data = validate_resp.json()
-                    if validate_data.get("idsResult", {}).get("verdict") == "suspicious":
-                        suspicious_count += 1
+        # Try multiple rapid handshakes (potential brute force): all inits at once, then all validates
+        init_bodies = [_json_dumps({"publicKey": fresh_pubkey()}) for _ in range(5)]
+        if httpx is not None:
+            validate_responses = asyncio.run(run_ids_brute(init_bodies))
+        else:
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                init_responses = list(executor.map(init, init_bodies))
+                handshake_ids = [jload(r).get("handshakeId") for r in init_responses if r.status_code == 200]
+                validate_responses = list(executor.map(validate, handshake_ids))
+        
+        suspicious_count = sum(
+            1 for r in validate_responses
+            if r.status_code == 200 and jload(r).get("idsResult", {}).get("verdict") == "suspicious"
+        )
         
         print_result("IDS Handshake Detection", True, 
                     f"Detected {suspicious_count}/5 suspicious handshakes")
@@ -408,51 +738,37 @@ def test_ids_handshake_detection(token):
         print_result("IDS Handshake Detection", False, f"Error: {e}")
         return False
 
+@register("get_alerts", deps=("normal_login",))
+@xdist_group("monitoring")
 def test_get_alerts(token):
     """TC-8: Get Intrusion Alerts"""
     print_header("TC-8: Get Intrusion Alerts")
-    if not token:
-        print_result("Get Alerts", False, "No auth token available")
-        return False
-    
     try:
-        response = requests.get(
-            f"{SERVER_URL}/alerts",
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=5
-        )
-        passed = response.status_code == 200
+        status_code, count = get_monitoring("/alerts")
+        passed = status_code == 200
         if passed:
-            data = response.json()
-            print_result("Get Alerts", True, f"Retrieved {len(data)} alerts")
+            print_result("Get Alerts", True, f"Retrieved {count} alerts")
             return True
         else:
-            print_result("Get Alerts", False, f"Status: {response.status_code}")
+            print_result("Get Alerts", False, f"Status: {status_code}")
             return False
     except Exception as e:
         print_result("Get Alerts", False, f"Error: {e}")
         return False
 
+@register("get_connection_logs", deps=("normal_login",))
+@xdist_group("monitoring")
 def test_get_connection_logs(token):
     """TC-9: Get Connection Logs"""
     print_header("TC-9: Get Connection Logs")
-    if not token:
-        print_result("Get Connection Logs", False, "No auth token available")
-        return False
-    
     try:
-        response = requests.get(
-            f"{SERVER_URL}/logs/connections",
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=5
-        )
-        passed = response.status_code == 200
+        status_code, count = get_monitoring("/logs/connections")
+        passed = status_code == 200
         if passed:
-            data = response.json()
-            print_result("Get Connection Logs", True, f"Retrieved {len(data)} connection logs")
+            print_result("Get Connection Logs", True, f"Retrieved {count} connection logs")
             return True
         else:
-            print_result("Get Connection Logs", False, f"Status: {response.status_code}")
+            print_result("Get Connection Logs", False, f"Status: {status_code}")
             return False
     except Exception as e:
         print_result("Get Connection Logs", False, f"Error: {e}")
@@ -461,80 +777,50 @@ def test_get_connection_logs(token):
 # ==================== Main Test Runner ====================
 
 def main():
-    print("\n" + "="*60)
-    print("  SECURE TRANSFER SYSTEM - COMPREHENSIVE TEST SUITE")
-    print("="*60)
-    print(f"\nServer URL: {SERVER_URL}")
-    print(f"IDS URL: {IDS_URL}")
-    print(f"Test Account: {TEST_EMAIL}")
+    log("\n" + "="*60)
+    log("  SECURE TRANSFER SYSTEM - COMPREHENSIVE TEST SUITE")
+    log("="*60)
+    log(f"\nServer URL: {SERVER_URL}")
+    log(f"IDS URL: {IDS_URL}")
+    log(f"Test Account: {TEST_EMAIL}")
+    flush_log()
     
-    # Pre-flight checks
+    # Pre-flight checks (both probes at once; TC-1/TC-2 reuse the results)
+    probe_health()
     if not check_backend_health():
-        print("\n❌ Backend server is not running!")
-        print("   Please start the backend: npm run server")
+        log("\n❌ Backend server is not running!")
+        log("   Please start the backend: npm run server")
+        flush_log()
         return
     
     ids_running = check_ids_health()
     if not ids_running:
-        print("\n⚠️  IDS service is not running - some tests may fail")
-        print("   To start IDS: cd ids_service && python app.py")
-    
-    # Run tests
-    token = None
-    handshake_data = None
-    
-    # Health checks
-    test_backend_health()
-    test_ids_health()
-    
-    # Authentication tests
-    token = test_normal_login()
-    test_invalid_login()
-    
-    if not token:
-        print("\n❌ Cannot proceed without authentication token!")
-        print("   Please check your test account credentials")
-        return
-    
-    # Handshake tests
-    handshake_data = test_handshake_init(token)
-    test_invalid_public_key(token)
-    
-    if handshake_data:
-        test_handshake_validate(token, handshake_data)
-    
-    test_wrong_handshake_id(token)
-    
-    # File upload tests
-    test_normal_file_upload(token)
-    test_large_file_upload(token)
-    test_empty_file_upload(token)
-    
-    # Security tests
-    test_unauthorized_access()
-    test_ids_handshake_detection(token)
+        log("\n⚠️  IDS service is not running - some tests may fail")
+        log("   To start IDS: cd ids_service && python app.py")
     
-    # Monitoring tests
-    test_get_alerts(token)
-    test_get_connection_logs(token)
+    # Run tests; each wave runs every test whose prerequisites are done, and dependents of a failed test are skipped
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        run_tests(executor)
     
     # Summary
     print_header("TEST SUMMARY")
     total = test_results["passed"] + test_results["failed"]
     pass_rate = (test_results["passed"] / total * 100) if total > 0 else 0
     
-    print(f"Total Tests: {total}")
-    print(f"✅ Passed: {test_results['passed']}")
-    print(f"❌ Failed: {test_results['failed']}")
-    print(f"⚠️  Warnings: {test_results['warnings']}")
-    print(f"Pass Rate: {pass_rate:.1f}%")
+    log(f"Total Tests: {total}")
+    log(f"✅ Passed: {test_results['passed']}")
+    log(f"❌ Failed: {test_results['failed']}")
+    log(f"⏭️  Skipped: {test_results['skipped']}")
+    log(f"⚠️  Warnings: {test_results['warnings']}")
+    log(f"Pass Rate: {pass_rate:.1f}%")
     
     if test_results["failed"] == 0:
-        print("\n🎉 ALL TESTS PASSED!")
+        log("\n🎉 ALL TESTS PASSED!")
     else:
-        print(f"\n⚠️  {test_results['failed']} test(s) failed")
+        log(f"\n⚠️  {test_results['failed']} test(s) failed")
     
-    print("\n" + "="*60)
+    log("\n" + "="*60)
+    flush_log()
 
 if __name__ == "__main__":
     main()
@@ -14,10 +14,10 @@ import ConnectionLog from '../models/ConnectionLog.js'
 const router = express.Router()
 const upload = multer({ storage: multer.memoryStorage() })
 
-// Alerts
-router.get('/alerts', requireAuth, async (req, res) => {
-  const alerts = await Alert.find({ userId: req.user.id }).sort({ createdAt: -1 }).limit(100)
-  res.json(alerts.map(a => ({
+// List queries shared by the GET routes and /batch
+async function listAlerts(userId) {
+  const alerts = await Alert.find({ userId }).sort({ createdAt: -1 }).limit(100)
+  return alerts.map(a => ({
     id: a._id.toString(),
     user_id: a.userId?.toString(),
     severity: a.severity,
@@ -28,7 +28,38 @@ router.get('/alerts', requireAuth, async (req, res) => {
     resolved: a.resolved,
     ml_score: a.ml_score,
     details: a.details,
-  })))
+  }))
+}
+
+async function listConnectionLogs(userId) {
+  const logs = await ConnectionLog.find({ userId }).sort({ createdAt: -1 }).limit(100)
+  return logs.map(l => ({
+    id: l._id.toString(),
+    user_id: l.userId?.toString(),
+    status: l.status,
+    handshake_type: l.handshake_type,
+    created_at: l.createdAt,
+    details: l.details,
+  }))
+}
+
+async function listTransfers(userId) {
+  const transfers = await Transfer.find({ userId }).sort({ createdAt: -1 }).limit(100)
+  return transfers.map(t => ({
+    id: t._id.toString(),
+    user_id: t.userId?.toString(),
+    filename: t.filename,
+    size: t.size,
+    status: t.status,
+    progress: t.progress,
+    encryption_method: t.encryption_method,
+    created_at: t.createdAt,
+  }))
+}
+
+// Alerts
+router.get('/alerts', requireAuth, async (req, res) => {
+  res.json(await listAlerts(req.user.id))
 })
 
 router.get('/alerts/:id', requireAuth, async (req, res) => {
@@ -55,30 +86,46 @@ router.patch('/alerts/:id/resolve', requireAuth, async (req, res) => {
 
 // Connection logs
 router.get('/logs/connections', requireAuth, async (req, res) => {
-  const logs = await ConnectionLog.find({ userId: req.user.id }).sort({ createdAt: -1 }).limit(100)
-  res.json(logs.map(l => ({
-    id: l._id.toString(),
-    user_id: l.userId?.toString(),
-    status: l.status,
-    handshake_type: l.handshake_type,
-    created_at: l.createdAt,
-    details: l.details,
-  })))
+  res.json(await listConnectionLogs(req.user.id))
 })
 
 // Transfer logs
 router.get('/logs/transfers', requireAuth, async (req, res) => {
-  const transfers = await Transfer.find({ userId: req.user.id }).sort({ createdAt: -1 }).limit(100)
-  res.json(transfers.map(t => ({
-    id: t._id.toString(),
-    user_id: t.userId?.toString(),
-    filename: t.filename,
-    size: t.size,
-    status: t.status,
-    progress: t.progress,
-    encryption_method: t.encryption_method,
-    created_at: t.createdAt,
-  })))
+  res.json(await listTransfers(req.user.id))
+})
+
+// Batched reads: [{ method: 'GET', url: '/alerts' }, ...] -> [{ status, body }, ...] in the same order,
+// so a dashboard or test fetches several lists with one request and one token check
+const BATCH_READS = {
+  '/alerts': listAlerts,
+  '/logs/connections': listConnectionLogs,
+  '/logs/transfers': listTransfers,
+}
+
+// Longest batch accepted; repeated reads are deduped, so this only bounds the request size
+const MAX_BATCH = 20
+
+router.post('/batch', requireAuth, async (req, res) => {
+  if (!Array.isArray(req.body)) return res.status(400).json({ error: 'Expected an array of requests' })
+  if (req.body.length > MAX_BATCH) {
+    return res.status(400).json({ error: `At most ${MAX_BATCH} requests per batch` })
+  }
+  const urls = req.body.map((item) => {
+    const { method = 'GET', url } = item || {}
+    return String(method).toUpperCase() === 'GET' && Object.hasOwn(BATCH_READS, url) ? url : null
+  })
+  // Each distinct read runs once; repeated entries share its result
+  const reads = new Map()
+  for (const url of new Set(urls)) {
+    if (url === null) continue
+    reads.set(url, BATCH_READS[url](req.user.id).then(
+      (body) => ({ status: 200, body }),
+      (err) => ({ status: 500, body: { error: err.message } }),
+    ))
+  }
+  const results = await Promise.all(urls.map((url) =>
+    url === null ? { status: 404, body: { error: 'Not batchable' } } : reads.get(url)))
+  res.json(results)
 })
 
 // File upload with IDS analysis (persist only if safe)
@@ -4,10 +4,31 @@ Setup and Verification Script
 Checks prerequisites, creates test account, and verifies endpoints before running tests
 """
 
-import requests
+import argparse
 import os
 import sys
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check prerequisites before running the security tests")
+    parser.add_argument("--yes", "-y", action="store_true", help="start the checks without waiting for Enter")
+    return parser.parse_args()
+
+# Parse arguments before the heavier imports below (asyncio, http.client), so --help exits without loading them
+if __name__ == "__main__":
+    ARGS = parse_args()
+
+import asyncio
+import base64
+import contextlib
+import contextvars
+import functools
+import hashlib
+import http.client
+import io
+import json
+import threading
 import time
+from urllib.parse import urlsplit
 
 # Configuration
 SERVER_URL = os.environ.get("SERVER_URL", "http://localhost:5000")
@@ -16,18 +37,264 @@ TEST_EMAIL = os.environ.get("TEST_EMAIL", "test@example.com")
 TEST_PASSWORD = os.environ.get("TEST_PASSWORD", "Test123!@#")
 IDS_URL = os.environ.get("IDS_URL", "http://localhost:6000")
 
+# Tokens from earlier runs, keyed by server and account, so a still-valid one skips the login round trip
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "setup_and_verify")
+TOKEN_CACHE_PATH = os.path.join(CACHE_DIR, "token.json")
+TOKEN_CACHE_KEY = f"{SERVER_URL} {TEST_EMAIL}"
+TOKEN_MIN_LIFETIME = 60  # seconds a cached token must still be valid for to be reused
+
+# sha256 of the server, email and password whose login last got a 401; later runs with them don't retry the login
+LAST_BAD_PATH = os.path.join(CACHE_DIR, "last_bad.txt")
+
+# Hosts that answered a HEAD health probe with 405/501; later probes to them use GET straight away
+_HEAD_UNSUPPORTED = set()
+
+# Hard limit for all checks together (the Enter prompt is not counted); exceeding it exits with status 2
+DEADLINE = 30
+
+# Output of the step being run, written to stdout in one call when the step ends; a context variable,
+# so steps running at the same time (each in its own task or thread) collect their output separately
+_step_output = contextvars.ContextVar("step_output", default=None)
+
+def say(line=""):
+    buf = _step_output.get()
+    if buf is None:
+        print(line)
+    else:
+        buf.write(line + "\n")
+
+def emit(text):
+    """Write a finished step's output with a single write call"""
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+@contextlib.contextmanager
+def output_block():
+    """Collect everything said inside the block and write it out once at the end"""
+    buf = io.StringIO()
+    token = _step_output.set(buf)
+    try:
+        yield
+    finally:
+        _step_output.reset(token)
+        emit(buf.getvalue())
+
+async def buffered(check, *args):
+    """Run a check (coroutine function, or plain function on a thread) with its output held back; returns (result, text)"""
+    buf = io.StringIO()
+    token = _step_output.set(buf)
+    try:
+        if asyncio.iscoroutinefunction(check):
+            result = await check(*args)
+        else:
+            result = await asyncio.to_thread(check, *args)  # copies the context, so the thread says into buf
+    finally:
+        _step_output.reset(token)
+    return result, buf.getvalue()
+
+async def run_step(check, *args):
+    """Run a check and write its output in one go; returns its result"""
+    result, text = await buffered(check, *args)
+    emit(text)
+    return result
+
+def jwt_expiry(token):
+    """exp claim of a JWT (seconds since epoch); inf if it has none, 0 if it cannot be decoded"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return claims.get("exp", float("inf"))
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+def _read_token_cache():
+    try:
+        with open(TOKEN_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_private(path, text):
+    """Write a cache file readable by the owner only (they hold bearer tokens and credential hashes)"""
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+    except OSError:
+        pass  # caching is best effort
+
+def _write_token_cache(cache):
+    _write_private(TOKEN_CACHE_PATH, json.dumps(cache))
+
+def load_cached_token():
+    """Token saved by an earlier run for this server and account, if it is valid for at least another minute"""
+    entry = _read_token_cache().get(TOKEN_CACHE_KEY, {})
+    if entry.get("exp", 0) - time.time() > TOKEN_MIN_LIFETIME:
+        return entry.get("token")
+    return None
+
+def save_token(token):
+    cache = _read_token_cache()
+    cache[TOKEN_CACHE_KEY] = {"token": token, "exp": jwt_expiry(token)}
+    _write_token_cache(cache)
+
+def forget_token():
+    cache = _read_token_cache()
+    if cache.pop(TOKEN_CACHE_KEY, None) is not None:
+        _write_token_cache(cache)
+
+def _credentials_digest():
+    return hashlib.sha256(f"{SERVER_URL}\n{TEST_EMAIL}\n{TEST_PASSWORD}".encode()).hexdigest()
+
+def known_bad_credentials():
+    """True if the last login attempt with exactly these credentials was rejected"""
+    try:
+        with open(LAST_BAD_PATH) as f:
+            return f.read().strip() == _credentials_digest()
+    except OSError:
+        return False
+
+def remember_bad_credentials():
+    _write_private(LAST_BAD_PATH, _credentials_digest())
+
+def forget_bad_credentials():
+    try:
+        os.remove(LAST_BAD_PATH)
+    except OSError:
+        pass
+
 def print_header(title):
-    print("\n" + "="*70)
-    print(f"  {title}")
-    print("="*70)
+    say("\n" + "="*70)
+    say(f"  {title}")
+    say("="*70)
 
 def print_check(name, passed, details=""):
     status = "✅" if passed else "❌"
-    print(f"{status} {name}")
+    say(f"{status} {name}")
     if details:
-        print(f"   {details}")
+        say(f"   {details}")
+
+async def port_closed(url, timeout=0.2):
+    """
+    Quick TCP connect to the host and port of url, so a dead service fails in milliseconds, not an HTTP timeout
+
+    Only a refused or failed connect counts as closed; a connect still
+    pending after timeout (slow or remote host) is left to the HTTP probe.
+    """
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, port), timeout)
+    except asyncio.TimeoutError:
+        return False
+    except OSError:
+        return True
+    writer.close()
+    await writer.wait_closed()
+    return False
+
+class KeepAliveSession:
+    """
+    Minimal JSON HTTP client on the standard library's http.client
+
+    Requests run on worker threads (asyncio.to_thread), so checks can still
+    overlap. Each thread keeps one HTTP/1.1 connection per host and reuses
+    it for later requests.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _connection(self, scheme, host, port):
+        connections = self._local.__dict__.setdefault("connections", {})
+        key = (scheme, host, port)
+        if key not in connections:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            connections[key] = cls(host, port)
+            with self._lock:
+                self._all.append(connections[key])
+        return connections[key]
+
+    def _request(self, method, url, body, headers, timeout):
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        conn = self._connection(parts.scheme, parts.hostname, parts.port)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        reused = conn.sock is not None
+        try:
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not reused:
+                    raise
+                # The server closed the idle keep-alive connection: retry once on a new one
+                conn.close()
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+            body = response.read()
+        except Exception:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        return Response(response.status, body)
 
-def check_server_health():
+    async def request(self, method, url, payload=None, headers=None, timeout=3):
+        """Send a request with an optional JSON payload; returns a Response"""
+        headers = dict(headers or {})
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode()
+            headers["Content-Type"] = "application/json"
+        return await asyncio.to_thread(self._request, method, url, body, headers, timeout)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+
+class Response:
+    """Status and raw body of a request; the body is only decoded if asked for, and only once"""
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    @functools.cached_property
+    def text(self):
+        return self.body.decode("utf-8", "replace")
+
+    @functools.cached_property
+    def _json(self):
+        return json.loads(self.text) if self.body else {}
+
+    def json(self):
+        """Parsed JSON body, or {} for an empty one"""
+        return self._json
+
+async def health_probe(session, url, timeout):
+    """HEAD a health URL (only the status matters, so no body is sent), falling back to GET where HEAD is not allowed"""
+    host = urlsplit(url).netloc
+    if host not in _HEAD_UNSUPPORTED:
+        response = await session.request("HEAD", url, timeout=timeout)
+        if response.status not in (405, 501):
+            return response
+        _HEAD_UNSUPPORTED.add(host)
+    return await session.get(url, timeout=timeout)
+
+async def check_server_health(session):
     """Check if server is running"""
     print_header("Step 1: Checking Server Health")
     
@@ -39,109 +306,108 @@ def check_server_health():
         "http://127.0.0.1:5000/api/health",
     ]
     
-    print(f"   Trying to connect to server...")
-    print(f"   SERVER_URL: {SERVER_URL}")
-    print(f"   API_BASE: {API_BASE}")
+    say(f"   Trying to connect to server...")
+    say(f"   SERVER_URL: {SERVER_URL}")
+    say(f"   API_BASE: {API_BASE}")
     
     for url in urls_to_try:
         try:
-            print(f"   Attempting: {url}")
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                data = response.json() if response.text else {}
-                print_check("Server is running", True, f"URL: {url}, Response: {data}")
+            say(f"   Attempting: {url}")
+            if await port_closed(url):
+                say(f"   ❌ Port closed: {url}")
+                continue
+            response = await health_probe(session, url, timeout=5)
+            if response.status == 200:
+                details = f"URL: {url}, Response: {response.json()}" if response.body else f"URL: {url}"
+                print_check("Server is running", True, details)
                 return True
-            elif response.status_code == 404:
-                print(f"   ❌ 404 Not Found (endpoint doesn't exist)")
+            elif response.status == 404:
+                say(f"   ❌ 404 Not Found (endpoint doesn't exist)")
                 continue
             else:
-                print(f"   ⚠️  Status {response.status_code} (but server is responding)")
+                say(f"   ⚠️  Status {response.status} (but server is responding)")
                 # Server is responding, even if not 200
-                print_check("Server is responding", True, f"Status: {response.status_code}")
+                print_check("Server is responding", True, f"Status: {response.status}")
                 return True
-        except requests.exceptions.ConnectionError as e:
-            print(f"   ❌ Connection failed: {url}")
+        except ConnectionError as e:
+            say(f"   ❌ Connection failed: {url}")
             continue
-        except requests.exceptions.Timeout:
-            print(f"   ⏱️  Timeout: {url}")
+        except TimeoutError:
+            say(f"   ⏱️  Timeout: {url}")
             continue
         except Exception as e:
-            print(f"   ⚠️  Error with {url}: {type(e).__name__}")
+            say(f"   ⚠️  Error with {url}: {type(e).__name__}")
             continue
     
     # If all URLs failed
     print_check("Server is running", False, "Cannot connect to any server URL")
-    print("\n   💡 Troubleshooting:")
-    print(f"      1. Is server running? Check: http://localhost:5000/api/health")
-    print(f"      2. Start server with: cd server && npm start")
-    print(f"      3. Check if server is on a different port")
-    print(f"      4. Try in browser: http://localhost:5000/api/health")
+    say("\n   💡 Troubleshooting:")
+    say(f"      1. Is server running? Check: http://localhost:5000/api/health")
+    say(f"      2. Start server with: cd server && npm start")
+    say(f"      3. Check if server is on a different port")
+    say(f"      4. Try in browser: http://localhost:5000/api/health")
     
     return False
 
-def check_ids_health():
+async def check_ids_health(session):
     """Check if IDS service is running"""
     print_header("Step 2: Checking IDS Service Health")
     
+    if await port_closed(IDS_URL):
+        print_check("IDS service is running", False, "Port closed - is IDS running on port 6000?")
+        say("\n   💡 Start IDS with: cd ids_service && python app.py")
+        return False
+    
     try:
-        response = requests.get(f"{IDS_URL}/health", timeout=3)
-        if response.status_code == 200:
-            data = response.json() if response.text else {}
-            print_check("IDS service is running", True, f"Response: {data}")
+        # GET, not HEAD: the body says whether the models actually loaded
+        response = await session.get(f"{IDS_URL}/health", timeout=3)
+        # The IDS answers 503 while its models are missing
+        if response.status in (200, 503):
+            health = response.json()
+            print_check("IDS service is running", True, f"Response: {health}")
+            if not health.get("models_loaded"):
+                print_check("IDS models loaded", False, "Train them with: cd ids_service && python enhanced_train.py")
+                return False
             return True
         else:
-            print_check("IDS service is running", False, f"Status: {response.status_code}")
+            print_check("IDS service is running", False, f"Status: {response.status}")
             return False
-    except requests.exceptions.ConnectionError:
+    except ConnectionError:
         print_check("IDS service is running", False, "Cannot connect - is IDS running on port 6000?")
-        print("\n   💡 Start IDS with: cd ids_service && python app.py")
+        say("\n   💡 Start IDS with: cd ids_service && python app.py")
         return False
     except Exception as e:
         print_check("IDS service is running", False, f"Error: {e}")
         return False
 
-def check_test_account():
-    """Check if test account exists and can login"""
+async def ensure_account(session):
+    """
+    Make sure the test account exists and get a token for it
+
+    Registers first, since a fresh environment usually has no account yet
+    (one round trip); only a 409 (email already used) falls through to a
+    login on the same keep-alive connection.
+
+    Returns:
+        tuple: (account ready, token or None)
+    """
     print_header("Step 3: Checking Test Account")
     
-    try:
-        response = requests.post(
-            f"{API_BASE}/auth/login",
-            json={"email": TEST_EMAIL, "password": TEST_PASSWORD},
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            token = data.get("token")
-            if token:
-                print_check("Test account exists", True, f"Email: {TEST_EMAIL}")
-                print_check("Login successful", True, f"Token received: {token[:20]}...")
-                return True, token
-            else:
-                print_check("Login successful", False, "No token in response")
-                return False, None
-        elif response.status_code == 401:
-            print_check("Test account exists", False, "Invalid credentials or account doesn't exist")
-            print(f"\n   💡 Attempting to create test account...")
-            return create_test_account()
-        else:
-            print_check("Test account check", False, f"Status: {response.status_code}, Response: {response.text}")
-            return False, None
-            
-    except Exception as e:
-        print_check("Test account check", False, f"Error: {e}")
+    token = load_cached_token()
+    if token:
+        # Not checked against the server here; Step 4 clears it if the server rejects it
+        print_check("Using cached token", True, f"Email: {TEST_EMAIL}, token: {token[:20]}... (unexpired, verified in Step 4)")
+        return True, token
+    
+    # The server rejects an empty password on both login and register
+    if not TEST_PASSWORD:
+        print_check("Test account check", False, "TEST_PASSWORD is empty")
         return False, None
-
-def create_test_account():
-    """Create test account if it doesn't exist"""
-    print_header("Creating Test Account")
     
     try:
-        # Try to register
-        response = requests.post(
+        response = await session.post(
             f"{API_BASE}/auth/register",
-            json={
+            payload={
                 "name": "Test User",
                 "email": TEST_EMAIL,
                 "password": TEST_PASSWORD
@@ -149,27 +415,54 @@ def create_test_account():
             timeout=5
         )
         
-        if response.status_code == 200:
-            data = response.json()
-            token = data.get("token")
+        if response.status == 200:
+            token = response.json().get("token")
+            forget_bad_credentials()
             print_check("Account created", True, f"Email: {TEST_EMAIL}")
             if token:
-                print_check("Login successful", True, f"Token received")
+                save_token(token)
+                print_check("Login successful", True, f"Token received: {token[:20]}...")
                 return True, token
             return True, None
-        elif response.status_code == 409:
-            print_check("Account creation", False, "Email already exists (but login failed - check password)")
+        elif response.status != 409:
+            print_check("Account creation", False, f"Status: {response.status}, Response: {response.text}")
+            return False, None
+        
+        print_check("Test account exists", True, f"Email: {TEST_EMAIL}")
+        if known_bad_credentials():
+            print_check("Login skipped", False, "Login with these credentials failed last run - check password")
+            say(f"   To retry the login, delete {LAST_BAD_PATH}")
+            return False, None
+        
+        response = await session.post(
+            f"{API_BASE}/auth/login",
+            payload={"email": TEST_EMAIL, "password": TEST_PASSWORD},
+            timeout=5
+        )
+        
+        if response.status == 200:
+            token = response.json().get("token")
+            if token:
+                save_token(token)
+                print_check("Login successful", True, f"Token received: {token[:20]}...")
+                return True, token
+            else:
+                print_check("Login successful", False, "No token in response")
+                return False, None
+        elif response.status == 401:
+            remember_bad_credentials()
+            print_check("Login successful", False, "Invalid credentials - check password")
             return False, None
         else:
-            print_check("Account creation", False, f"Status: {response.status_code}, Response: {response.text}")
+            print_check("Login successful", False, f"Status: {response.status}, Response: {response.text}")
             return False, None
             
     except Exception as e:
-        print_check("Account creation", False, f"Error: {e}")
+        print_check("Test account check", False, f"Error: {e}")
         return False, None
 
-def verify_endpoints(token):
-    """Verify that API endpoints are accessible"""
+async def verify_endpoints(session, token):
+    """Verify that API endpoints are accessible; None if the token was rejected"""
     print_header("Step 4: Verifying API Endpoints")
     
     if not token:
@@ -184,35 +477,35 @@ def verify_endpoints(token):
     
     all_passed = True
     
-    for name, method, url, data in endpoints_to_check:
-        try:
-            if method == "GET":
-                response = requests.get(
-                    url,
-                    headers={"Authorization": f"Bearer {token}"},
-                    timeout=3
-                )
-            else:
-                response = requests.post(
-                    url,
-                    json=data,
-                    headers={"Authorization": f"Bearer {token}"},
-                    timeout=3
-                )
-            
-            # For authenticated endpoints, 401 means auth works, 400/404 means endpoint exists
-            # For upload, we expect 400 (no file) not 404
-            if response.status_code in [200, 400, 403, 404]:
-                status_ok = response.status_code != 404  # 404 means endpoint not found
-                print_check(f"{name} endpoint", status_ok, f"Status: {response.status_code}")
-                if not status_ok:
-                    all_passed = False
-            else:
-                print_check(f"{name} endpoint", True, f"Status: {response.status_code}")
-                
-        except Exception as e:
-            print_check(f"{name} endpoint", False, f"Error: {e}")
+    async def probe(method, url, data):
+        response = await session.request(method, url, payload=data, headers={"Authorization": f"Bearer {token}"}, timeout=3)
+        return response.status
+    
+    # The probes are independent: send them all at once
+    statuses = await asyncio.gather(
+        *[probe(method, url, data) for _, method, url, data in endpoints_to_check],
+        return_exceptions=True
+    )
+    
+    if 401 in statuses:
+        # Token rejected (e.g. a cached one the server no longer accepts): drop it so the next check logs in
+        forget_token()
+        print_check("Token accepted", False, "Status: 401, cached token cleared")
+        return None
+    
+    for (name, _, _, _), status in zip(endpoints_to_check, statuses):
+        if isinstance(status, Exception):
+            print_check(f"{name} endpoint", False, f"Error: {status or type(status).__name__}")  # timeouts have no message
             all_passed = False
+        # For authenticated endpoints, 401 means auth works, 400/404 means endpoint exists
+        # For upload, we expect 400 (no file) not 404
+        elif status in [200, 400, 403, 404]:
+            status_ok = status != 404  # 404 means endpoint not found
+            print_check(f"{name} endpoint", status_ok, f"Status: {status}")
+            if not status_ok:
+                all_passed = False
+        else:
+            print_check(f"{name} endpoint", True, f"Status: {status}")
     
     return all_passed
 
@@ -223,15 +516,6 @@ def check_test_files():
     from pathlib import Path
     test_dir = Path("test_files")
     
-    if not test_dir.exists():
-        print_check("Test files directory", False, f"Directory '{test_dir}' not found")
-        print(f"\n   💡 Creating directory...")
-        test_dir.mkdir(exist_ok=True)
-        print_check("Test files directory created", True)
-        return False
-    
-    print_check("Test files directory", True, f"Found: {test_dir}")
-    
     # Check for specific files
     expected_files = [
         "corrupted_png.png",
@@ -241,36 +525,67 @@ def check_test_files():
         "suspicious_encrypted.bin"
     ]
     
+    # One directory read instead of exists() + stat() per file; DirEntry already knows the file type
+    try:
+        with os.scandir(test_dir) as entries:
+            present = {
+                entry.name: entry.stat().st_size
+                for entry in entries if entry.name in expected_files and entry.is_file()
+            }
+    except FileNotFoundError:
+        print_check("Test files directory", False, f"Directory '{test_dir}' not found")
+        say(f"\n   💡 Creating directory...")
+        test_dir.mkdir(exist_ok=True)
+        print_check("Test files directory created", True)
+        return False
+    
+    print_check("Test files directory", True, f"Found: {test_dir}")
+    
     found_files = []
     for filename in expected_files:
-        filepath = test_dir / filename
-        if filepath.exists():
+        if filename in present:
             found_files.append(filename)
-            print_check(f"  {filename}", True, f"Size: {filepath.stat().st_size} bytes")
+            print_check(f"  {filename}", True, f"Size: {present[filename]} bytes")
         else:
             print_check(f"  {filename}", False, "Not found")
     
     if len(found_files) > 0:
-        print(f"\n   ✅ Found {len(found_files)}/{len(expected_files)} test files")
+        say(f"\n   ✅ Found {len(found_files)}/{len(expected_files)} test files")
         return True
     else:
-        print(f"\n   ⚠️  No test files found (some tests may create them automatically)")
+        say(f"\n   ⚠️  No test files found (some tests may create them automatically)")
         return True  # Still OK, some tests create files
 
-def main():
+def should_prompt(assume_yes):
+    """Only wait for Enter when someone is at the terminal: not with --yes, piped stdin or in CI"""
+    in_ci = os.environ.get("CI", "").lower() in ("1", "true")
+    return not assume_yes and not in_ci and sys.stdin.isatty()
+
+async def main(assume_yes=False):
     """Main verification function"""
-    print("\n" + "="*70)
-    print("  🔍 SETUP & VERIFICATION CHECK")
-    print("="*70)
-    print("\nThis script checks prerequisites before running security tests.")
-    print(f"\nConfiguration:")
-    print(f"   Server: {SERVER_URL}")
-    print(f"   IDS: {IDS_URL}")
-    print(f"   Test Email: {TEST_EMAIL}")
-    print()
-    
-    input("Press Enter to continue or Ctrl+C to cancel...")
-    
+    with output_block():
+        say("\n" + "="*70)
+        say("  🔍 SETUP & VERIFICATION CHECK")
+        say("="*70)
+        say("\nThis script checks prerequisites before running security tests.")
+        say(f"\nConfiguration:")
+        say(f"   Server: {SERVER_URL}")
+        say(f"   IDS: {IDS_URL}")
+        say(f"   Test Email: {TEST_EMAIL}")
+        say()
+    
+    if should_prompt(assume_yes):
+        input("Press Enter to continue or Ctrl+C to cancel...")
+    
+    # Keep-alive connections shared by every check, instead of a new connection per call
+    session = KeepAliveSession()
+    try:
+        return await asyncio.wait_for(run_checks(session), DEADLINE)
+    finally:
+        session.close()
+
+async def run_checks(session):
+    """Run every check on the shared session and print the summary"""
     results = {
         "server": False,
         "ids": False,
@@ -279,75 +594,98 @@ def main():
         "files": False
     }
     
+    # Steps 1, 2 and 5 don't depend on each other: run them at once, then report them in step order
+    server, ids, files = await asyncio.gather(
+        buffered(check_server_health, session),
+        buffered(check_ids_health, session),
+        buffered(check_test_files),
+    )
+    (results["server"], server_output), (results["ids"], ids_output), (results["files"], files_output) = server, ids, files
+    
     # Step 1: Check server
-    results["server"] = check_server_health()
+    emit(server_output)
     if not results["server"]:
-        print("\n❌ Server is not running. Please start it first!")
+        with output_block():
+            say("\n❌ Server is not running. Please start it first!")
         return False
     
     # Step 2: Check IDS
-    results["ids"] = check_ids_health()
+    emit(ids_output)
     if not results["ids"]:
-        print("\n⚠️  IDS service is not running. Some tests may fail.")
-        print("   Tests can still run, but IDS detection will be limited.")
+        with output_block():
+            say("\n⚠️  IDS service is not running. Some tests may fail.")
+            say("   Tests can still run, but IDS detection will be limited.")
     
     # Step 3: Check/Create account
-    account_ok, token = check_test_account()
+    account_ok, token = await run_step(ensure_account, session)
     results["account"] = account_ok
     
     if not account_ok:
-        print("\n❌ Cannot authenticate. Please:")
-        print(f"   1. Create account manually at {API_BASE}/auth/register")
-        print(f"   2. Or check credentials: {TEST_EMAIL}")
+        with output_block():
+            say("\n❌ Cannot authenticate. Please:")
+            say(f"   1. Create account manually at {API_BASE}/auth/register")
+            say(f"   2. Or check credentials: {TEST_EMAIL}")
         return False
     
     # Step 4: Verify endpoints
-    results["endpoints"] = verify_endpoints(token)
+    results["endpoints"] = await run_step(verify_endpoints, session, token)
+    if results["endpoints"] is None:
+        # Log in again now that the rejected token is gone from the cache, and retry once
+        account_ok, token = await run_step(ensure_account, session)
+        results["account"] = account_ok
+        results["endpoints"] = account_ok and bool(await run_step(verify_endpoints, session, token))
     
     # Step 5: Check test files
-    results["files"] = check_test_files()
+    emit(files_output)
     
-    # Summary
+    with output_block():
+        return summarize(results)
+
+def summarize(results):
+    """Print the summary; True if every critical check passed"""
     print_header("Summary")
     
     all_critical = results["server"] and results["account"]
     all_optional = results["ids"] and results["endpoints"] and results["files"]
     
-    print(f"\nCritical Checks:")
-    print(f"   {'✅' if results['server'] else '❌'} Server running")
-    print(f"   {'✅' if results['account'] else '❌'} Test account ready")
+    say(f"\nCritical Checks:")
+    say(f"   {'✅' if results['server'] else '❌'} Server running")
+    say(f"   {'✅' if results['account'] else '❌'} Test account ready")
     
-    print(f"\nOptional Checks:")
-    print(f"   {'✅' if results['ids'] else '⚠️ '} IDS service")
-    print(f"   {'✅' if results['endpoints'] else '⚠️ '} API endpoints")
-    print(f"   {'✅' if results['files'] else '⚠️ '} Test files")
+    say(f"\nOptional Checks:")
+    say(f"   {'✅' if results['ids'] else '⚠️ '} IDS service")
+    say(f"   {'✅' if results['endpoints'] else '⚠️ '} API endpoints")
+    say(f"   {'✅' if results['files'] else '⚠️ '} Test files")
     
     if all_critical:
-        print("\n" + "="*70)
-        print("  ✅ READY TO RUN TESTS!")
-        print("="*70)
-        print("\nAll critical checks passed. You can now run:")
-        print("   python run_full_security_tests.py")
-        print("\nOr run individual tests:")
-        print("   python client/client.py")
-        print("   python attack_simulator.py")
-        print("   python upload_corrupted_file.py")
+        say("\n" + "="*70)
+        say("  ✅ READY TO RUN TESTS!")
+        say("="*70)
+        say("\nAll critical checks passed. You can now run:")
+        say("   python run_full_security_tests.py")
+        say("\nOr run individual tests:")
+        say("   python client/client.py")
+        say("   python attack_simulator.py")
+        say("   python upload_corrupted_file.py")
         return True
     else:
-        print("\n" + "="*70)
-        print("  ❌ NOT READY - Fix issues above")
-        print("="*70)
+        say("\n" + "="*70)
+        say("  ❌ NOT READY - Fix issues above")
+        say("="*70)
         return False
 
 if __name__ == "__main__":
     try:
-        success = main()
+        success = asyncio.run(main(assume_yes=ARGS.yes))
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
-        print("\n\n⚠️  Cancelled by user")
+        say("\n\n⚠️  Cancelled by user")
         sys.exit(1)
+    except asyncio.TimeoutError:
+        say(f"\n\n❌ Setup checks did not finish within {DEADLINE}s - is a service hanging?")
+        sys.exit(2)
     except Exception as e:
-        print(f"\n\n❌ Fatal error: {e}")
+        say(f"\n\n❌ Fatal error: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)